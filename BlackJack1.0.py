@@ -1,459 +1,650 @@
 import pygame
-import random
+import atexit
 import os
-import json
 import sys
+from types import SimpleNamespace
+
+from blackjack_engine import Rules, Shoe, ShoePool, ShoeStream, Table, calculate_hand, card_name, suits, ranks, DECK_SIZE, STARTING_CHIPS, CHIP_VALUES, NUM_AI_PLAYERS
+from blackjack_render import DirtyRenderer, SpriteCache, TextCache
+from blackjack_assets import AssetJob, load_assets
+from blackjack_timeline import Timeline
+from blackjack_store import ChipStore
+from blackjack_odds import move_evs, shoe_composition
+from blackjack_profile import FrameProfiler
+from blackjack_history import HandHistory, MAX_AI_SEATS, NO_ANSWER
+from blackjack_strategy import Strategy
+from blackjack_stats import SessionStats
+from blackjack_server import RemoteTable
 
 # Initialize Pygame
 game_title = "Blackjack"
 pygame.init()
-WIDTH, HEIGHT = 1920, 1080
-screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.FULLSCREEN)
+DESIGN_W, DESIGN_H = 1920, 1080  # the layout below is written for this size and scaled with px()
+display = pygame.display.set_mode((DESIGN_W, DESIGN_H), pygame.FULLSCREEN)
 pygame.display.set_caption(game_title)
+
+# The scene is drawn at the internal resolution (BLACKJACK_RESOLUTION=1280x720, say) and scaled
+# once onto the display, which cuts fill rate on slow machines. By default it is the display's.
+_res = os.environ.get("BLACKJACK_RESOLUTION")
+WIDTH, HEIGHT = map(int, _res.lower().split("x")) if _res else display.get_size()
+SCALE = min(WIDTH / DESIGN_W, HEIGHT / DESIGN_H)
+screen = display if (WIDTH, HEIGHT) == display.get_size() else pygame.Surface((WIDTH, HEIGHT)).convert()
+
+
+def px(v):
+    # Design pixels to internal pixels
+    return round(v * SCALE)
+
+
+def to_canvas(pos):
+    # Display coordinates (mouse) to internal coordinates
+    dw, dh = display.get_size()
+    return pos[0] * WIDTH // dw, pos[1] * HEIGHT // dh
+
+
+def present_canvas():
+    # Show the whole canvas; used by screens drawn outside the renderer
+    if screen is not display:
+        pygame.transform.scale(screen, display.get_size(), display)
+    pygame.display.flip()
+
+
 clock = pygame.time.Clock()
-font = pygame.font.SysFont(None, 36)
+FPS = 30
+IDLE_TIMEOUT = 1000  # longest the loop sleeps while nothing on screen changes (ms)
+REDRAW_EVENTS = (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED)  # the window needs repainting
+font = pygame.font.SysFont(None, px(36))
+popup_font = pygame.font.Font(None, px(60))
 
 # Paths and constants
 CARD_FOLDER = r"Cards (large)"
 CHIPS_FOLDER = os.getcwd()
 CHIP_SAVE_FILE = "chips.json"
-STARTING_CHIPS = 100
-NUM_DECKS = 6
-NUM_AI_PLAYERS = 2
+HAND_HISTORY_FILE = "hands.bjh"
+RULES = Rules()  # decks, cut card, dealer and payout rules; no splitting or surrender at this table
+STATS_CSV_FILE = os.environ.get("BLACKJACK_STATS_CSV", "session_stats.csv")  # empty turns the export off
+if STATS_CSV_FILE:
+    STATS_CSV_FILE = os.path.abspath(STATS_CSV_FILE)  # the export at exit may run from another directory
+STATS_EXPORT_INTERVAL = 60000  # wall time between rows of the CSV export (ms)
 
 # Card dimensions & positions
-CARD_W, CARD_H = 150, 250
-CARD_GAP = 170
-DEALER_POS = (WIDTH//2 - (CARD_GAP + CARD_W)//2, 100)
-HUMAN_POS = (WIDTH//2 - (CARD_GAP + CARD_W)//2, HEIGHT - CARD_H - 100)
-AI_POSITIONS = [
-    (100, HEIGHT//2 - CARD_H//2),
-    (WIDTH - 100 - CARD_W - CARD_GAP, HEIGHT//2 - CARD_H//2)
-]
-SHOE_POS = (WIDTH - CARD_W - 50, 50)
-
-# Card and chip data
-suits = ['hearts','diamonds','clubs','spades']
-ranks = ['2','3','4','5','6','7','8','9','10','J','Q','K','A']
-chip_values = {"chip_black":1000,"chip_green":500,"chip_blue":100,"chip_red":50,"chip_white":25}
-chip_button_positions = {"chip_black":(100,900),"chip_green":(220,900),"chip_blue":(340,900),"chip_red":(460,900),"chip_white":(580,900)}
+CARD_W, CARD_H = px(150), px(250)
+CARD_GAP = px(170)
+SHADOW = px(5)  # card shadow offset
+DEALER_POS = (WIDTH//2 - (CARD_GAP + CARD_W)//2, px(100))
+HUMAN_POS = (WIDTH//2 - (CARD_GAP + CARD_W)//2, HEIGHT - CARD_H - px(100))
+AI_SEATS = max(0, min(MAX_AI_SEATS, int(os.environ.get("BLACKJACK_AI_SEATS", NUM_AI_PLAYERS))))
+
+
+def ai_positions(n):
+    # (x, y, max hand width) per seat. Seats fill the middle row from both edges,
+    # left side first, squeezing their cards together and leaving the centre for prompts.
+    per_side = max(1, -(-n // 2))
+    step = min(px(460), (WIDTH//2 - px(300)) // per_side)
+    width = min(px(300), step - px(20))
+    y = HEIGHT//2 - CARD_H//2
+    left = [(px(100) + i * step, y, width) for i in range(min(n, per_side))]
+    right = [(WIDTH - px(100) - i * step - min(CARD_W + CARD_GAP, step - px(20)), y, width) for i in range(n - per_side)]
+    return left + right[::-1]
+
+
+AI_POSITIONS = ai_positions(AI_SEATS)
+SHOE_POS = (WIDTH - CARD_W - px(50), px(50))
+
+# Chip data
+chip_values = CHIP_VALUES
+chip_button_positions = {k: (px(x), px(y)) for k, (x, y) in
+                         {"chip_black":(100,900),"chip_green":(220,900),"chip_blue":(340,900),"chip_red":(460,900),"chip_white":(580,900)}.items()}
+CHIP_SIZE = px(100)
 
 #Game Variables
-player_card_queue = []
-dealer_card_queue = []
-card_draw_timer = 0
+hidden_cards = {}  # hand name -> cards dealt by the engine but not yet revealed
 CARD_DRAW_INTERVAL = 300  # milliseconds delay between cards
-show_count_until = 0  # timestamp in ms
+ANIMATION_SPEEDS = [1, 2, 4, 0]  # F4 cycles through these, 0 skips animations
+timeline = Timeline(speed=ANIMATION_SPEEDS[0])
+# Game logic runs on its own clock in fixed steps. Normally it keeps pace with the wall clock;
+# in turbo it runs a set number of steps per rendered frame, as fast as the machine allows.
+STEP_MS = 10  # logic clock step
+MAX_CATCHUP = 250  # most logic time made up at once after a stall (ms)
+ROUND_OVER_DELAY = 3000  # from the payout to the count check prompt (ms)
+AUTOPLAY_DELAY = 400  # logic time the autoplayer waits before each move (ms)
+TURBO_BATCH = 1000  # steps between checks for input while rendering is off
+TURBO_MODES = [None, 10, 100, 1000, 0]  # F8: steps per frame; None is real time, 0 draws once a second
+logic_now = 0  # the logic clock (ms)
+logic_offset = 0  # logic time minus wall time while running in real time
+turbo = int(os.environ["BLACKJACK_TURBO"]) if os.environ.get("BLACKJACK_TURBO") else None
+autoplay = bool(os.environ.get("BLACKJACK_AUTOPLAY"))  # F7: the player's seat plays itself
+rounds_played = 0
+show_temp_count = False  # count shown for a moment by the Check Count button
+popup_message = ""
 count_check_paused = False  # New flag to delay the count input
+show_sprite_stats = False  # F2 shows sprite and text cache use per frame
+show_ev = False  # F5 shows the EV of hit/stand/double while playing
+show_session_stats = False  # F9 shows the running session statistics
+stats_exported = 0  # wall time of the last CSV row (ms)
+sprites = SpriteCache()
+texts = TextCache()  # every label goes through here, so unchanged strings are never re-rendered
+profiler = FrameProfiler(budget_ms=1000 / FPS)  # F3 shows the HUD, F6 records a trace
+if os.environ.get("BLACKJACK_TRACE"):
+    profiler.start_recording(os.environ["BLACKJACK_TRACE"])
 
 
 
 # Load images
-card_images, chip_images = {}, {}
-card_back = pygame.transform.scale(pygame.image.load(os.path.join(CARD_FOLDER, "card_back.png")), (CARD_W, CARD_H))
-for suit in suits:
-    for rank in ranks:
-        file_rank = f"{int(rank):02}" if rank.isdigit() else rank
-        path = os.path.join(CARD_FOLDER, f"card_{suit}_{file_rank}.png")
-        if os.path.exists(path):
-            img = pygame.image.load(path)
-            card_images[f"{rank}_{suit}"] = pygame.transform.scale(img, (CARD_W, CARD_H))
-for k in chip_values:
-    p = os.path.join(CHIPS_FOLDER, f"{k}.png")
-    if os.path.exists(p):
-        img = pygame.image.load(p)
-        chip_images[k] = pygame.transform.scale(img, (100, 100))
-
-# Background
-try:
-    TABLE_BG = pygame.transform.scale(
-        pygame.image.load(os.path.join(CARD_FOLDER, "table_felt.png")),
-        (WIDTH, HEIGHT)
-    )
-except FileNotFoundError:
-    TABLE_BG = None
+def draw_loading(done, total):
+    # Progress bar while the asset pipeline works, so the window never sits black
+    pygame.event.pump()
+    screen.fill((20,60,20))
+    bar = pygame.Rect(WIDTH//2 - px(300), HEIGHT//2, px(600), px(30))
+    pygame.draw.rect(screen, (255,255,255), bar, 2)
+    pygame.draw.rect(screen, (255,255,255), (bar.x, bar.y, bar.w * done // total, bar.h))
+    txt = texts.render(font, "Loading...", (255,255,255))
+    screen.blit(txt, (WIDTH//2 - txt.get_width()//2, HEIGHT//2 - px(50)))
+    present_canvas()
+
+
+def asset_jobs():
+    jobs = [AssetJob("card_back", os.path.join(CARD_FOLDER, "card_back.png"), (CARD_W, CARD_H))]
+    for suit in suits:
+        for rank in ranks:
+            file_rank = f"{int(rank):02}" if rank.isdigit() else rank
+            path = os.path.join(CARD_FOLDER, f"card_{suit}_{file_rank}.png")
+            if os.path.exists(path):
+                jobs.append(AssetJob(f"{rank}_{suit}", path, (CARD_W, CARD_H)))
+    for k in chip_values:
+        p = os.path.join(CHIPS_FOLDER, f"{k}.png")
+        if os.path.exists(p):
+            jobs.append(AssetJob(k, p, (CHIP_SIZE, CHIP_SIZE)))
+    felt = os.path.join(CARD_FOLDER, "table_felt.png")
+    if os.path.exists(felt):
+        jobs.append(AssetJob("table_felt", felt, (WIDTH, HEIGHT), alpha=False))
+    return jobs
+
+
+assets = load_assets(asset_jobs(), on_progress=draw_loading)
+card_back = assets.pop("card_back")
+TABLE_BG = assets.pop("table_felt", None)  # Background
+chip_images = {k: assets.pop(k) for k in chip_values if k in assets}
+card_images = [assets.get(card_name(c), card_back) for c in range(DECK_SIZE)]  # indexed by card
+
+# Helper functions
+# Chips live in memory; the store journals and writes them in the background
+store = ChipStore(CHIP_SAVE_FILE, starting=STARTING_CHIPS)
+atexit.register(store.close)
+history = HandHistory(HAND_HISTORY_FILE)  # every round, for analysing play and count training
+atexit.register(history.close)
+session = SessionStats()  # the same rounds folded into running totals, in constant memory
+if STATS_CSV_FILE:
+    atexit.register(lambda: session.net.n and session.write_csv(STATS_CSV_FILE))
+
+def load_chips():
+    return store.load()
+
+def save_chips(c, event):
+    store.record(event, c)
 
 # Game state and phases
+# The engine owns the shoe, chips and hands; the GUI only tracks what is shown.
+# Shoes are shuffled ahead in the background; BLACKJACK_SEED replays a fixed sequence of shoes
+shoe_seed = os.environ.get("BLACKJACK_SEED")
+# BLACKJACK_AI_SEATS sets how many AI players sit in (up to MAX_AI_SEATS); they play the strategy tables
+# BLACKJACK_SERVER=host:port (or a Unix socket path) plays at a blackjack_server.py table instead:
+# the server deals and settles, and this window only draws its states and sends the clicks
+REMOTE = os.environ.get("BLACKJACK_SERVER")
+if REMOTE:
+    REMOTE_EVENT = pygame.event.custom_type()  # a state arrived; wakes an idle wait
+    table = RemoteTable(REMOTE, notify=lambda: pygame.event.post(pygame.event.Event(REMOTE_EVENT)))
+    atexit.register(table.close)
+    AI_POSITIONS = ai_positions(len(table.round.ai_hands))
+else:
+    table = Table(shoe=Shoe(source=ShoePool(ShoeStream(RULES.decks, seed=shoe_seed)), penetration=RULES.penetration),
+                  chips=load_chips(), num_ai_players=AI_SEATS, ai_strategy=Strategy(RULES), rules=RULES)
+rnd = table.round
+player_hand, dealer_hand, ai_hands = rnd.player_hand, rnd.dealer_hand, rnd.ai_hands
+player_split_hand = rnd.split_hand
 show_count = False
-insurance_bet = 0
-player_hand, dealer_hand = [], []
-ai_hands = [[] for _ in range(NUM_AI_PLAYERS)]
-player_split_hand = []
 split_active = False
-round_result = ""
 game_phase = "betting"  # "betting", "insurance", "playing", "count_check", "round_over", "game_over"
 count_input = ""
-current_bet = 0
-chip_count = STARTING_CHIPS
-
-# Helper functions
-def load_chips():
-    if os.path.exists(CHIP_SAVE_FILE):
-        try:
-            c = json.load(open(CHIP_SAVE_FILE)).get("chips", STARTING_CHIPS)
-            return c if c > 0 else STARTING_CHIPS
-        except:
-            pass
-    return STARTING_CHIPS
+undo_stack = []  # table snapshots from before each hit this round; U takes the last one back
 
-def save_chips(c):
-    json.dump({"chips": c}, open(CHIP_SAVE_FILE, "w"))
 
-chip_count = load_chips()
+def draw_card_with_shadow(card, x, y, surf=None):
+    surf = surf or screen
+    surf.blit(sprites.shade((CARD_W, CARD_H), (0, 0, 0, 100)), (x + SHADOW, y + SHADOW))
+    img = card_back if card is None else card_images[card]
+    surf.blit(img, (x, y))
 
 
-def draw_card_with_shadow(card, x, y):
-    shadow = pygame.Surface((CARD_W, CARD_H), pygame.SRCALPHA)
-    shadow.fill((0, 0, 0, 100))
-    screen.blit(shadow, (x + 5, y + 5))
-    img = card_back if not isinstance(card, tuple) else card_images.get(f"{card[0]}_{card[1]}", card_back)
-    screen.blit(img, (x, y))
-
-
-def draw_hand(hand, x, y, max_width=None):
-    n = len(hand)
-    if n == 0:
-        return
-
+def hand_gap(n, x, max_width=None):
     if max_width is None:
-        max_width = WIDTH - x - 50
+        max_width = WIDTH - x - px(50)
 
     # Avoid division by zero or negative gap
     gap = CARD_GAP
     if n > 1:
         total_needed = CARD_W + (n - 1) * CARD_GAP
         if total_needed > max_width:
-            gap = max(20, (max_width - CARD_W) // (n - 1))
+            gap = max(px(20), (max_width - CARD_W) // (n - 1))
+    return gap
+
 
+def draw_hand(hand, x, y, max_width=None, surf=None):
+    gap = hand_gap(len(hand), x, max_width)
     for i, c in enumerate(hand):
-        if isinstance(c, tuple):  # Valid card
-            draw_card_with_shadow(c, x + i * gap, y)
-
-
-def calculate_hand(hand):
-    value, aces = 0, 0
-    for r, _ in hand:
-        if r in ['J','Q','K']:
-            value += 10
-        elif r == 'A':
-            value += 11
-            aces += 1
-        else:
-            value += int(r)
-    while value > 21 and aces:
-        value -= 10
-        aces -= 1
-    return value
+        if c is not None:  # Valid card
+            draw_card_with_shadow(c, x + i * gap, y, surf)
+
+
+def add_hand(name, hand, x, y, max_width=None):
+    # Queue a hand for the renderer; the rect covers the cards and their shadows
+    if not hand:
+        return
+    hand = list(hand)
+    gap = hand_gap(len(hand), x, max_width)
+    rect = (x, y, CARD_W + SHADOW + gap * (len(hand) - 1), CARD_H + SHADOW)
+    renderer.add(name, hand, rect, lambda surf: draw_hand(hand, x, y, max_width, surf))
 
 
-def create_shoe():
-    return [(r, s) for _ in range(NUM_DECKS) for s in suits for r in ranks]
+def add_text(name, text, color, pos, f=None):
+    txt = texts.render(f or font, text, color)
+    rect = txt.get_rect(topleft=pos)
+    renderer.add(name, (text, color), rect, lambda surf: surf.blit(txt, rect))
 
-shoe = create_shoe()
-random.shuffle(shoe)
-used_cards = []
 
-def draw_card(sh_list):
-    global shoe
-    if len(shoe) < 52:
-        shoe = create_shoe()
-        random.shuffle(shoe)
-        used_cards.clear()
-    card = shoe.pop()
-    used_cards.append(card)
-    return card
+def add_centered_text(name, text, color, y, f=None):
+    w = texts.render(f or font, text, color).get_width()
+    add_text(name, text, color, (WIDTH//2 - w//2, y), f)
+
+
+def shown(hand, name):
+    # Cards waiting on the timeline are already in the engine's hand
+    n = hidden_cards.get(name, 0)
+    return hand[:len(hand) - n] if n else hand
 
 
 def draw_count():
-    cnt = 0
-    for rank, _ in used_cards:
-        if rank in ['2', '3', '4', '5', '6']:
-            cnt += 1
-        elif rank in ['10', 'J', 'Q', 'K', 'A']:
-            cnt -= 1
-        # Ignore 7, 8, 9
+    count = table.shoe.count
+    add_text("count", f"Running: {count.running} | True: {count.true_count():.2f}", (255,255,0), (px(50), px(1000)))
+
+
+def build_static_layer(surf):
+    # Felt, shoe stack and (while betting) the chip buttons never move
+    if TABLE_BG:
+        surf.blit(TABLE_BG, (0, 0))
+    else:
+        surf.fill((34,139,34))
+        pygame.draw.ellipse(surf, (0,80,0), (px(50), px(50), WIDTH-px(100), HEIGHT-px(200)))
+        pygame.draw.ellipse(surf, (0,120,0), (px(70), px(70), WIDTH-px(140), HEIGHT-px(260)))
+
+    x0, y0 = SHOE_POS
+    shadow = sprites.shade((CARD_W, CARD_H), (0, 0, 0, 100))
+    for i in range(min(len(table.shoe)//20,12)):
+        surf.blit(shadow, (x0 + i*SHADOW + SHADOW, y0 + i*SHADOW + SHADOW))
+        surf.blit(card_back, (x0 + i*SHADOW, y0 + i*SHADOW))
+
+    if game_phase == "betting":
+        for k, pos in chip_button_positions.items():
+            surf.blit(chip_images[k], pos)
+
+
+PANEL_RECT = pygame.Rect(px(50), px(20), px(300), px(120))
+
 
-    decks_remaining = max(len(shoe) / 52, 1)
-    tc = cnt / decks_remaining
+def draw_panel(surf, chips, bet):
+    surf.blit(sprites.shade(PANEL_RECT.size, (0,0,0,120)), PANEL_RECT)
+    surf.blit(texts.render(font, f"Chips: {chips}", (255,255,255)), (px(60), px(30)))
+    surf.blit(texts.render(font, f"Bet: {bet}", (255,255,255)), (px(60), px(70)))
 
-    txt = font.render(f"Running: {cnt} | True: {tc:.2f}", True, (255,255,0))
-    screen.blit(txt, (50, 1000))
 
 # Central draw routine used by main loop and animations
 def draw_table():
-    # Existing background/table drawing...
-    if TABLE_BG:
-        screen.blit(TABLE_BG, (0, 0))
-    else:
-        screen.fill((34,139,34))
-        pygame.draw.ellipse(screen, (0,80,0), (50,50, WIDTH-100, HEIGHT-200))
-        pygame.draw.ellipse(screen, (0,120,0), (70,70, WIDTH-140, HEIGHT-260))
+    renderer.set_static((min(len(table.shoe)//20,12), game_phase == "betting"), build_static_layer)
 
     # Stats panel (chips, bet display)
-    panel = pygame.Surface((300,120), pygame.SRCALPHA)
-    panel.fill((0,0,0,120))
-    screen.blit(panel, (50,20))
-    screen.blit(font.render(f"Chips: {chip_count}", True, (255,255,255)), (60,30))
-    screen.blit(font.render(f"Bet: {current_bet}", True, (255,255,255)), (60,70))
+    chips, bet = table.chip_count, rnd.bet
+    renderer.add("panel", (chips, bet), PANEL_RECT, lambda surf: draw_panel(surf, chips, bet))
 
     # Dealer hand
     dx, dy = DEALER_POS
     if game_phase in ("count_check", "round_over", "game_over", "insurance", "dealer_drawing"):
-        draw_hand(dealer_hand, dx, dy, max_width=800)
+        add_hand("dealer", shown(dealer_hand, "dealer"), dx, dy, max_width=px(800))
 
     else:
-        if dealer_hand:
-            draw_card_with_shadow(None, dx, dy)
-        if len(dealer_hand) > 1:
-            draw_card_with_shadow(dealer_hand[1], dx + CARD_GAP, dy)
+        visible = len(shown(dealer_hand, "dealer"))
+        if visible:
+            renderer.add("dealer", "hole", (dx, dy, CARD_W + SHADOW, CARD_H + SHADOW),
+                         lambda surf: draw_card_with_shadow(None, dx, dy, surf))
+        if visible > 1:
+            add_hand("dealer_up", dealer_hand[1:2], dx + CARD_GAP, dy)
 
     # AI players hands
     for i, ai in enumerate(ai_hands):
-        draw_hand(ai, AI_POSITIONS[i][0], AI_POSITIONS[i][1], max_width=300)
+        x, y, width = AI_POSITIONS[i]
+        add_hand(f"ai{i}", shown(ai, f"ai{i}"), x, y, max_width=width)
 
 
     # Human player hand
-    draw_hand(player_hand, HUMAN_POS[0], HUMAN_POS[1], max_width=800)
+    add_hand("player", shown(player_hand, "player"), HUMAN_POS[0], HUMAN_POS[1], max_width=px(800))
 
 
     # Chips visual next to player’s cards (small chips visualizing bet)
-    if current_bet > 0:
-        chip_x = HUMAN_POS[0] - 20
-        chip_y = HUMAN_POS[1] + CARD_H - 40
-        draw_bet_chips(current_bet, chip_x, chip_y)
+    if bet > 0:
+        chip_x = HUMAN_POS[0] - px(20)
+        chip_y = HUMAN_POS[1] + CARD_H - px(40)
+        renderer.add("bet_chips", bet, bet_chips_rect(bet, chip_x, chip_y),
+                     lambda surf: draw_bet_chips(bet, chip_x, chip_y, surf))
 
     # Ensure betting chips and buttons ALWAYS drawn explicitly
     if game_phase == "betting":
-        for k, pos in chip_button_positions.items():
-            screen.blit(chip_images[k], pos)
-        if current_bet > 0:
-            deal_button.draw(screen)
-        clear_button.draw(screen)
+        if rnd.bet > 0:
+            deal_button.add_to(renderer)
+        clear_button.add_to(renderer)
 
     # Playing action buttons
     if game_phase == "playing":
-        hit_button.draw(screen)
-        stand_button.draw(screen)
-        double_button.draw(screen)
-        split_button.draw(screen)
-        check_count_button.draw(screen)
+        hit_button.add_to(renderer)
+        stand_button.add_to(renderer)
+        double_button.add_to(renderer)
+        split_button.add_to(renderer)
+        check_count_button.add_to(renderer)
 
 
     # Round/game over button clearly visible
     if game_phase in ("round_over", "game_over"):
-        new_round_button.draw(screen)
-        result_text = font.render(round_result, True, (255,255,255))
-        screen.blit(result_text, (WIDTH//2 - result_text.get_width()//2, HEIGHT//2 - 40))
-
-    # Shoe visual (ensure shoe drawn explicitly)
-    x0, y0 = SHOE_POS
-    for i in range(min(len(shoe)//20,12)):
-        s = pygame.Surface((CARD_W, CARD_H), pygame.SRCALPHA)
-        s.fill((0,0,0,100))
-        screen.blit(s, (x0 + i*5 + 5, y0 + i*5 + 5))
-        screen.blit(card_back, (x0 + i*5, y0 + i*5))
-
-    # Optional count display
-    
-    if show_count or game_phase == "betting":
-        draw_count()
-
+        new_round_button.add_to(renderer)
+        add_centered_text("result", rnd.result, (255,255,255), HEIGHT//2 - px(40))
 
     if split_active and player_split_hand:
-        sx = HUMAN_POS[0] + CARD_GAP * len(player_hand) + 20
-        draw_hand(player_split_hand, sx, HUMAN_POS[1], max_width=500)
-    
+        sx = HUMAN_POS[0] + CARD_GAP * len(player_hand) + px(20)
+        add_hand("split", player_split_hand, sx, HUMAN_POS[1], max_width=px(500))
+
     # Optional count display
-    if game_phase in ("round_over", "count_check") or pygame.time.get_ticks() < show_count_until:
+    if (show_count or game_phase in ("betting", "round_over", "count_check")
+            or show_temp_count):
         draw_count()
 
 
 def draw_hand_values():
     # Player
-    player_val = calculate_hand(player_hand)
-    txt = font.render(f"Player: {player_val}", True, (255, 255, 255))
-    screen.blit(txt, (HUMAN_POS[0], HUMAN_POS[1] - 30))
+    player_val = calculate_hand(shown(player_hand, "player"))
+    add_text("player_value", f"Player: {player_val}", (255, 255, 255), (HUMAN_POS[0], HUMAN_POS[1] - px(30)))
 
     # Dealer — only show full hand value when it's supposed to be revealed
     if game_phase in ("count_check", "round_over", "game_over", "dealer_drawing"):
-        dealer_val = calculate_hand(dealer_hand)
-        txt = font.render(f"Dealer: {dealer_val}", True, (255, 255, 255))
-        screen.blit(txt, (DEALER_POS[0], DEALER_POS[1] - 40))
+        dealer_val = calculate_hand(shown(dealer_hand, "dealer"))
+        add_text("dealer_value", f"Dealer: {dealer_val}", (255, 255, 255), (DEALER_POS[0], DEALER_POS[1] - px(40)))
     else:
         # Show just one card value (optional, can be removed for full realism)
-        if len(dealer_hand) >= 2:
+        if len(shown(dealer_hand, "dealer")) >= 2:
             val = calculate_hand([dealer_hand[1]])  # Just second (visible) card
-            txt = font.render(f"Dealer: {val}+?", True, (200, 200, 200))
-            screen.blit(txt, (DEALER_POS[0], DEALER_POS[1] - 40))
+            add_text("dealer_value", f"Dealer: {val}+?", (200, 200, 200), (DEALER_POS[0], DEALER_POS[1] - px(40)))
 
     # AI Players
     for i, ai in enumerate(ai_hands):
-        val = calculate_hand(ai)
-        label = font.render(f"AI {i+1}: {val}", True, (255, 255, 255))
-        screen.blit(label, (AI_POSITIONS[i][0], AI_POSITIONS[i][1] + CARD_H + 10))
+        val = calculate_hand(shown(ai, f"ai{i}"))
+        x, y, _ = AI_POSITIONS[i]
+        add_text(f"ai{i}_value", f"AI {i+1}: {val}", (255, 255, 255), (x, y + CARD_H + px(10)))
     
 
 
-def show_temp_count():
-    global show_count_until
-    show_count_until = pygame.time.get_ticks() + 2000  # Show for 2 seconds
+def draw_ev_overlay():
+    # The hole card is unseen by the player, so it goes back into the shoe. A server table
+    # keeps its shoe's composition to itself.
+    if REMOTE or len(dealer_hand) < 2 or hidden_cards.get("player"):
+        return
+    comp = shoe_composition(table.shoe.count, unseen=dealer_hand[:1])
+    evs = move_evs(player_hand, dealer_hand[1], comp, RULES.hit_soft_17)
+    add_text("ev", f"EV  Hit {evs['hit']:+.3f} | Stand {evs['stand']:+.3f} | Double {evs['double']:+.3f}",
+             (255,255,0), (px(150), HEIGHT - px(290)))
+
+
+def draw_profile_hud():
+    lines = profiler.summary(clock.get_fps())
+    for i, line in enumerate(lines):
+        add_text(f"profile{i}", line, (0,255,0), (px(20), px(20 + i * 30)))
+
+
+def toggle_trace():
+    if profiler.trace is None:
+        profiler.start_recording()
+        show_popup_message("Recording frame trace (F6 to stop)", duration=1000)
+    else:
+        show_popup_message(f"Trace saved to {profiler.stop_recording()}", duration=1500)
+
+
+def set_temp_count(on):
+    global show_temp_count
+    show_temp_count = on
+
+
+def show_temp_count_for(duration=2000):
+    set_temp_count(True)
+    timeline.cancel("count")
+    timeline.after(duration, lambda: set_temp_count(False), channel="count", scaled=False)
+
+
+def wait_idle():
+    # Nothing changed on screen last frame, so sleep until input or the next timeline
+    # event (a card reveal, a popup timing out, the count check). Returns the event that woke us.
+    due = timeline.next_due()
+    timeout = IDLE_TIMEOUT if due is None else min(IDLE_TIMEOUT, int(due - logic_now))
+    if timeout <= 0:
+        clock.tick(FPS)
+        return []
+    ev = pygame.event.wait(timeout)
+    clock.tick()  # the wait was the frame delay; don't add another
+    return [] if ev.type == pygame.NOEVENT else [ev]
 
 
 # Pause screen
 # Moved out of draw_table to global scope
+def draw_pause(txt):
+    screen.fill((30,30,30))
+    screen.blit(txt, (WIDTH//2 - txt.get_width()//2, HEIGHT//2))
+    present_canvas()
+
+
 def pause_game():
+    # The pause screen is static: draw it, then sleep in event.wait until something happens
     paused = True
-    pf = pygame.font.Font(None, 60)
-    txt = pf.render("Game Paused. Press ENTER to resume or ESC to exit.", True, (255,255,255))
+    txt = texts.render(popup_font, "Game Paused. Press ENTER to resume or ESC to exit.", (255,255,255))
+    draw_pause(txt)
     while paused:
-        for ev in pygame.event.get():
-            if ev.type == pygame.QUIT:
+        ev = pygame.event.wait()
+        if ev.type in REDRAW_EVENTS:
+            draw_pause(txt)
+        if ev.type == pygame.QUIT:
+            pygame.quit(); sys.exit()
+        if ev.type == pygame.KEYDOWN:
+            if ev.key == pygame.K_RETURN:
+                paused = False
+            elif ev.key == pygame.K_ESCAPE:
                 pygame.quit(); sys.exit()
-            if ev.type == pygame.KEYDOWN:
-                if ev.key == pygame.K_RETURN:
-                    paused = False
-                elif ev.key == pygame.K_ESCAPE:
-                    pygame.quit(); sys.exit()
-        screen.fill((30,30,30))
-        screen.blit(txt, (WIDTH//2 - txt.get_width()//2, HEIGHT//2))
-        pygame.display.flip()
-        clock.tick(30)
 
 
     paused = True
-    pf = pygame.font.Font(None, 60)
-    txt = pf.render("Game Paused. Press ENTER to resume or ESC to exit.", True, (255,255,255))
+    txt = texts.render(popup_font, "Game Paused. Press ENTER to resume or ESC to exit.", (255,255,255))
+    draw_pause(txt)
     while paused:
-        screen.fill((30,30,30))
-        screen.blit(txt, (WIDTH//2 - txt.get_width()//2, HEIGHT//2))
-        pygame.display.flip()
-        for ev in pygame.event.get():
-            if ev.type == pygame.QUIT:
+        ev = pygame.event.wait()
+        if ev.type in REDRAW_EVENTS:
+            draw_pause(txt)
+        if ev.type == pygame.QUIT:
+            pygame.quit(); sys.exit()
+        if ev.type == pygame.KEYDOWN:
+            if ev.key == pygame.K_RETURN:
+                paused = False
+            elif ev.key == pygame.K_ESCAPE:
                 pygame.quit(); sys.exit()
-            if ev.type == pygame.KEYDOWN:
-                if ev.key == pygame.K_RETURN:
-                    paused = False
-                elif ev.key == pygame.K_ESCAPE:
-                    pygame.quit(); sys.exit()
+    renderer.invalidate()
 
 
 #Reset count/shuffle Message 
+def set_popup(message):
+    global popup_message
+    popup_message = message
+
+
 def show_popup_message(message, duration=2000):
-    popup_font = pygame.font.Font(None, 60)
-    text = popup_font.render(message, True, (255, 255, 255))
-    bg = pygame.Surface((text.get_width() + 40, text.get_height() + 40))
-    bg.fill((0, 0, 0))
-    bg_rect = bg.get_rect(center=(WIDTH//2, HEIGHT//2))
-    text_rect = text.get_rect(center=bg_rect.center)
-
-    screen.blit(bg, bg_rect.topleft)
-    screen.blit(text, text_rect.topleft)
-    pygame.display.flip()
-    pygame.time.delay(duration)
+    # Shown over the table until the timeline clears it; input keeps working
+    set_popup(message)
+    timeline.cancel("popup")
+    timeline.after(duration, lambda: set_popup(""), channel="popup", scaled=False)
+
+
+def draw_popup():
+    message = popup_message
+    text = texts.render(popup_font, message, (255, 255, 255))
+    w, h = text.get_size()
+    bg_rect = pygame.Rect(0, 0, w + px(40), h + px(40))
+    bg_rect.center = (WIDTH//2, HEIGHT//2)
+
+    def draw(surf):
+        surf.blit(sprites.shade(bg_rect.size, (0, 0, 0)), bg_rect.topleft)
+        surf.blit(text, text.get_rect(center=bg_rect.center))
+    renderer.add("popup", message, bg_rect, draw)
 
 
 # Round functions
-def reset_round():
-    global player_hand, dealer_hand, ai_hands, game_phase, insurance_bet, round_result, show_count_until, chip_count, current_bet
+def reveal(name, then=None, delay=CARD_DRAW_INTERVAL):
+    # Uncover one of the hand's hidden cards after delay, in timeline order
+    def step():
+        hidden_cards[name] -= 1
+        if then:
+            then()
+    timeline.after(delay, step, channel="cards")
 
-    show_count_until = 0  # Hide the count when new round starts
-    player_hand.clear()
-    dealer_hand.clear()
-    for h in ai_hands:
-        h.clear()
-    insurance_bet = 0
-    round_result = ""
 
-    #  Deduct the player's bet now, not later
-    save_chips(chip_count)
+def set_phase(phase):
+    global game_phase
+    game_phase = phase
 
-    # Deal initial cards
-    deal_order = [player_hand, dealer_hand] + ai_hands
-    for _ in range(2):
-        for hand in deal_order:
-            hand.append(draw_card(shoe))
-            draw_table()
-            pygame.display.flip()
-            pygame.time.delay(300)
-
-    # Handle blackjack case
-    if calculate_hand(player_hand) == 21 and dealer_hand[1][0] != 'A':
-        chip_count += int(current_bet * 2.5)  # Original bet already deducted
-        save_chips(chip_count)
-        game_phase = 'round_over'
-    elif dealer_hand[1][0] == 'A':
-        game_phase = 'insurance'
-    else:
-        game_phase = 'playing'
 
+def round_ended():
+    global rounds_played, stats_exported
+    history.end_round(table)
+    session.end_round(table)
+    rounds_played += 1
+    now = pygame.time.get_ticks()
+    if STATS_CSV_FILE and now - stats_exported >= STATS_EXPORT_INTERVAL:
+        session.write_csv(STATS_CSV_FILE)
+        stats_exported = now
+
+
+def reset_round():
+    global game_phase
+
+    timeline.cancel("count")
+    timeline.cancel("round_over")
+    set_temp_count(False)  # Hide the count when new round starts
+    timeline.cancel("cards")
+    undo_stack.clear()
+
+    # Deal initial cards; a player blackjack is paid inside the engine
+    phase = table.deal()
+    if phase == "over":
+        save_chips(table.chip_count, "blackjack")
+        round_ended()
+        phase = 'round_over'
+
+    # The engine has dealt already; reveal the cards in dealing order
+    names = ["player", "dealer"] + [f"ai{i}" for i in range(len(ai_hands))]
+    hidden_cards.clear()
+    hidden_cards.update({name: 2 for name in names})
+    game_phase = "dealing"
+    for _ in range(2):
+        for name in names:
+            reveal(name)
+    timeline.after(0, lambda: set_phase(phase), channel="cards")
 
-    
 
 def handle_insurance(choice):
-    global insurance_bet, chip_count, game_phase, round_result
+    global game_phase
 
-    if choice == 'Y':
-        insurance_bet = min(current_bet // 2, chip_count)
-        chip_count -= insurance_bet
+    phase = table.insurance(choice == 'Y')
+    save_chips(table.chip_count, "insurance")
+    if phase == "over":
+        round_ended()
+    game_phase = 'round_over' if phase == "over" else 'playing'
 
-    # Dealer already has two cards — check if it's blackjack
-    if calculate_hand(dealer_hand) == 21:
-        chip_count += insurance_bet * 2
-        round_result = 'Dealer blackjack! Insurance pays 2:1.'
-        game_phase = 'round_over'
-    else:
-        round_result = 'No dealer blackjack.'
-        game_phase = 'playing'
 
+def round_settled():
+    table.settle()
+    save_chips(table.chip_count, "payout")
+    round_ended()
+    timeline.after(ROUND_OVER_DELAY, prompt_count_check, channel="round_over", scaled=False)
+    set_phase("round_over")
 
 
-def finish_round():
-    global chip_count, round_result, game_phase, current_bet, card_draw_timer, dealer_card_queue
+def prompt_count_check():
+    global count_input, count_check_paused
+    if game_phase == "round_over":
+        count_input = ""
+        count_check_paused = True  # pause before enabling count input
 
-    # Prevent crashing due to missing hands
-    if not isinstance(player_hand, list) or not isinstance(dealer_hand, list):
-        round_result = "Error: Internal hand state corrupted."
-        game_phase = "game_over"
-        current_bet = 0
-        save_chips(chip_count)
-        return
 
-    if len(player_hand) == 0 or len(dealer_hand) == 0:
-        round_result = "Error: Missing cards in hand."
-        game_phase = "game_over"
-        current_bet = 0
-        save_chips(chip_count)
-        return
+def begin_count_check():
+    global game_phase, count_check_paused
+    count_check_paused = False
+    game_phase = "count_check"
 
-    # Clear any previous dealer draw queue (prevents double-evaluation)
-    dealer_card_queue.clear()
 
-    # AI players draw up to 17
-    for h in ai_hands:
-        while calculate_hand(h) < 17:
-            h.append(draw_card(shoe))
+def count_answer():
+    # The typed count (NO_ANSWER if none), recorded against the true running count
+    running_count = table.shoe.count.running
+    answer = int(count_input) if count_input.lstrip('-').isdigit() else NO_ANSWER
+    history.count_answer(answer, running_count)
+    session.count_answer(answer, running_count)
+    return answer
 
-    # Queue dealer's draws
-    dealer_total = calculate_hand(dealer_hand)
-    while dealer_total < 17:
-        dealer_card_queue.append(draw_card(shoe))
-        dealer_total = calculate_hand(dealer_hand + dealer_card_queue)  # Predict future total
 
-    card_draw_timer = pygame.time.get_ticks()
-    game_phase = "dealer_drawing"
+def submit_count():
+    global game_phase
+    running_count = table.shoe.count.running
+    if count_answer() == running_count:
+        rnd.result = "Correct!"
+        game_phase = "round_over"
+    else:
+        rnd.result = f"Incorrect! Count was {running_count}. You lose your bet."
+        table.chip_count = max(0, table.chip_count - rnd.bet)
+        rnd.bet = 0
+        save_chips(table.chip_count, "count_penalty")
+        game_phase = "game_over"
 
 
+def finish_round():
+    global game_phase
+
+    # AI players draw up to 17 at once, the dealer's draws are revealed in turn
+    drawn = table.finish()
+    hidden_cards["dealer"] = hidden_cards.get("dealer", 0) + len(drawn)
+    for _ in drawn:
+        reveal("dealer")
+    timeline.after(0, round_settled, channel="cards")
+    game_phase = "dealer_drawing"
+
 
+def player_card_shown():
+    # Bust or a double ends the player's turn once the card is on the table
+    if game_phase == "player_doubling" or (game_phase == "playing" and calculate_hand(player_hand) > 21):
+        finish_round()
 
 
 # Actions
 def hit_action():
-    global card_draw_timer
-    player_card_queue.append(draw_card(shoe))
-    card_draw_timer = pygame.time.get_ticks()  # <-- explicitly reset timer here
-
+    undo_stack.append(table.snapshot())
+    table.hit()
+    hidden_cards["player"] = hidden_cards.get("player", 0) + 1
+    reveal("player", then=player_card_shown)
 
 
+def undo_hit():
+    # Put the last hit card back on the shoe, for trying the other play
+    if not undo_stack or hidden_cards.get("player"):
+        return
+    table.restore(undo_stack.pop())
+    show_popup_message("Hit taken back", duration=1000)
 
 
 def stand_action():
@@ -461,71 +652,211 @@ def stand_action():
 
 
 def double_action():
-    global chip_count, current_bet, card_draw_timer, game_phase
+    global game_phase
 
-    if chip_count >= current_bet:
-        chip_count -= current_bet
-        current_bet *= 2
-        save_chips(chip_count)
+    if table.double() is not None:
+        save_chips(table.chip_count, "double")
 
-        # Queue one more card and change phase
-        player_card_queue.append(draw_card(shoe))
-        card_draw_timer = pygame.time.get_ticks()
+        # Reveal one more card and change phase
+        hidden_cards["player"] = hidden_cards.get("player", 0) + 1
+        reveal("player", then=player_card_shown)
         game_phase = "player_doubling"
 
 
-
-
-
 def split_action():
-    pass  # unchanged
+    pass  # RULES.split is off; the table has no layout for a second hand
 
 def add_bet(ch):
-    global chip_count, current_bet
-    v = chip_values[ch]
-    if chip_count >= v:
-        current_bet += v
-        chip_count -= v
-        save_chips(chip_count)
+    if table.add_bet(chip_values[ch]):
+        save_chips(table.chip_count, "bet")
     else:
         show_popup_message("Not enough chips for that bet!", duration=1500)
 
 
 
 def clear_bet():
-    global chip_count, current_bet
-    chip_count += current_bet
-    current_bet = 0
-    save_chips(chip_count)
+    table.clear_bet()
+    save_chips(table.chip_count, "clear")
 
 
 def deal_action():
     # Always start a new round, even if no bet placed (for testing/dealing)
     reset_round()
 
-def draw_bet_chips(bet, x, y):
+def draw_bet_chips(bet, x, y, surf=None):
     """Draw chips representing the current bet next to the player's cards."""
+    surf = surf or screen
     sorted_chips = sorted(chip_values.items(), key=lambda x: -x[1])
-    spacing = 25  # Small spacing between chips
+    spacing = px(25)  # Small spacing between chips
     chip_scale = 0.4  # Scaling down chips to 40%
     for chip_name, chip_val in sorted_chips:
-        chip_img_small = pygame.transform.scale(chip_images[chip_name], (int(100 * chip_scale), int(100 * chip_scale)))
+        chip_img_small = sprites.scaled(chip_images[chip_name], (int(CHIP_SIZE * chip_scale), int(CHIP_SIZE * chip_scale)))
         while bet >= chip_val:
-            screen.blit(chip_img_small, (x, y))
+            surf.blit(chip_img_small, (x, y))
             x += spacing
             bet -= chip_val
 
 
+def bet_chips_rect(bet, x, y):
+    n = 0
+    for chip_val in chip_values.values():
+        n += bet // chip_val
+        bet %= chip_val
+    small = int(CHIP_SIZE * 0.4)
+    return (x, y, px(25) * max(n - 1, 0) + small, small)
+
+
 
 def handle_new_round_click():
-    global game_phase, chip_count, current_bet
-    if game_phase == "game_over" and chip_count <= 0:
-        chip_count = STARTING_CHIPS
-        save_chips(chip_count)
-    current_bet = 0
+    global game_phase
+    if game_phase == "game_over" and table.chip_count <= 0:
+        table.chip_count = STARTING_CHIPS
+        save_chips(table.chip_count, "reset")
+    timeline.cancel("round_over")
+    table.new_round()
     game_phase = "betting"
 
 
+# Autoplay and the logic clock
+def autoplay_move():
+    # One move for the player's seat, the same calls the buttons and keys make
+    global count_input, autoplay
+    if timeline.busy("cards") or (REMOTE and table.pending):
+        return
+    if game_phase == "betting":
+        if rnd.bet:
+            actions.deal()
+        else:
+            if table.chip_count < min(chip_values.values()):
+                if REMOTE:  # only the server can top the chips up
+                    autoplay = False
+                    show_popup_message("Out of chips, autoplay off")
+                    return
+                table.chip_count = STARTING_CHIPS
+                save_chips(table.chip_count, "reset")
+            actions.add_bet(min(chip_values, key=chip_values.get))
+    elif game_phase == "insurance":
+        actions.insurance("N")
+    elif game_phase == "playing":
+        action = table.ai_strategy.action(player_hand, dealer_hand[1], table.shoe.count.true_count())
+        if action == "double" and table.chip_count >= rnd.bet:
+            actions.double()
+        elif action == "stand":
+            actions.stand()
+        else:
+            actions.hit()
+    elif count_check_paused:
+        actions.count_check()
+    elif game_phase == "count_check":
+        count_input = str(table.shoe.count.running)
+        actions.submit_count()
+    elif game_phase in ("round_over", "game_over") and not timeline.busy("round_over"):
+        actions.new_round()
+
+
+def logic_step():
+    global logic_now
+    logic_now += STEP_MS
+    timeline.update(logic_now)
+    if autoplay and not timeline.busy("autoplay") and not timeline.busy("cards"):
+        timeline.after(AUTOPLAY_DELAY, autoplay_move, channel="autoplay")
+
+
+def advance_logic(now):
+    # Real time: step until the logic clock reaches the wall clock
+    global logic_now
+    target = now + logic_offset
+    if target - logic_now > MAX_CATCHUP:
+        logic_now = target - MAX_CATCHUP
+    while logic_now + STEP_MS <= target:
+        logic_step()
+
+
+def set_turbo(mode):
+    global turbo, logic_offset
+    turbo = mode
+    logic_offset = logic_now - pygame.time.get_ticks()  # real time resumes from here
+
+
+def draw_session_stats():
+    for i, line in enumerate(session.summary()):
+        add_text(f"session{i}", line, (255,255,255), (px(20), px(300) + i * px(30)))
+
+
+def draw_autoplay_status():
+    mode = "real time" if turbo is None else f"turbo {turbo} steps/frame" if turbo else "turbo, drawing off"
+    add_text("autoplay", f"{'Autoplay' if autoplay else 'Manual'} | {mode} | rounds {rounds_played} | "
+             f"logic {logic_now / 1000:.0f} s", (0,255,255), (px(400), px(20)))
+
+
+
+# The player's moves, as the buttons, keys and autoplay make them
+class RemoteActions:
+    """Moves at a server table, sent as requests.
+
+    Chips, the count and the card reveals all come back in the server's
+    states, so nothing is saved or animated here.
+    """
+    def __init__(self, table):
+        self.table = table
+
+    def deal(self):
+        self.table.send("deal")
+
+    def insurance(self, choice):
+        self.table.send("insurance", take=choice == 'Y')
+
+    def hit(self):
+        self.table.send("hit")
+
+    def undo_hit(self):
+        pass  # the server deals from its own shoe
+
+    def stand(self):
+        self.table.send("stand")
+
+    def double(self):
+        self.table.send("double")
+
+    def add_bet(self, ch):
+        self.table.send("bet", amount=chip_values[ch])
+
+    def clear_bet(self):
+        self.table.send("clear")
+
+    def new_round(self):
+        self.table.send("new_round")
+
+    def count_check(self):
+        global count_check_paused
+        count_check_paused = False
+        self.table.send("count_check")
+
+    def submit_count(self):
+        answer = count_answer()
+        self.table.send("count", count=None if answer == NO_ANSWER else answer)
+
+
+if REMOTE:
+    actions = RemoteActions(table)
+else:
+    actions = SimpleNamespace(deal=deal_action, insurance=handle_insurance, hit=hit_action, undo_hit=undo_hit,
+                              stand=stand_action, double=double_action, add_bet=add_bet, clear_bet=clear_bet,
+                              new_round=handle_new_round_click, count_check=begin_count_check,
+                              submit_count=submit_count)
+
+
+def sync_remote():
+    # Take in the states that have arrived; the server's phase is the one shown
+    global game_phase
+    settled = table.rounds_settled
+    for error in table.poll():
+        show_popup_message(error, duration=1500)
+    game_phase = table.phase
+    if table.rounds_settled != settled:
+        round_ended()
+        timeline.after(ROUND_OVER_DELAY, prompt_count_check, channel="round_over", scaled=False)
+
 
 # Button class
 class Button:
@@ -535,164 +866,189 @@ class Button:
         self.action = action
         self.color = (70,130,180)
         self.hcolor = (100,149,237)
-    def draw(self, surf):
-        col = self.hcolor if self.rect.collidepoint(pygame.mouse.get_pos()) else self.color
-        pygame.draw.rect(surf, col, self.rect, border_radius=8)
-        txt = font.render(self.text, True, (255,255,255))
+    def hovered(self):
+        return self.rect.collidepoint(to_canvas(pygame.mouse.get_pos()))
+    def draw(self, surf, hovered=None):
+        if hovered is None:
+            hovered = self.hovered()
+        col = self.hcolor if hovered else self.color
+        pygame.draw.rect(surf, col, self.rect, border_radius=px(8))
+        txt = texts.render(font, self.text, (255,255,255))
         surf.blit(txt, txt.get_rect(center=self.rect.center))
+    def add_to(self, renderer):
+        hovered = self.hovered()
+        renderer.add(self.text, hovered, self.rect, lambda surf: self.draw(surf, hovered))
     def is_clicked(self, ev):
         if ev.type == pygame.MOUSEBUTTONDOWN and self.rect.collidepoint(ev.pos):
             self.action()
 
 # Instantiate buttons
-hit_button = Button((150, HEIGHT-240, 120,50), "Hit", hit_action)
-stand_button = Button((290, HEIGHT-240, 120,50), "Stand", stand_action)
-double_button = Button((430, HEIGHT-240, 120,50), "Double", double_action)
-split_button = Button((570, HEIGHT-240, 120,50), "Split", split_action)
-deal_button = Button((SHOE_POS[0], SHOE_POS[1]+CARD_H+20, 120,50), "Deal", deal_action)
-clear_button = Button((SHOE_POS[0], SHOE_POS[1]+CARD_H+90, 120,50), "Clear", clear_bet)
-new_round_button = Button((WIDTH//2-60, HEIGHT//2+40, 120,50), "New", handle_new_round_click)
-check_count_button = Button((WIDTH - 180, HEIGHT - 80, 160, 50), "Check Count", lambda: show_temp_count())
+BUTTON_W, BUTTON_H = px(120), px(50)
+hit_button = Button((px(150), HEIGHT-px(240), BUTTON_W, BUTTON_H), "Hit", actions.hit)
+stand_button = Button((px(290), HEIGHT-px(240), BUTTON_W, BUTTON_H), "Stand", actions.stand)
+double_button = Button((px(430), HEIGHT-px(240), BUTTON_W, BUTTON_H), "Double", actions.double)
+split_button = Button((px(570), HEIGHT-px(240), BUTTON_W, BUTTON_H), "Split", split_action)
+deal_button = Button((SHOE_POS[0], SHOE_POS[1]+CARD_H+px(20), BUTTON_W, BUTTON_H), "Deal", actions.deal)
+clear_button = Button((SHOE_POS[0], SHOE_POS[1]+CARD_H+px(90), BUTTON_W, BUTTON_H), "Clear", actions.clear_bet)
+new_round_button = Button((WIDTH//2-px(60), HEIGHT//2+px(40), BUTTON_W, BUTTON_H), "New", actions.new_round)
+check_count_button = Button((WIDTH - px(180), HEIGHT - px(80), px(160), BUTTON_H), "Check Count", lambda: show_temp_count_for())
 
 
-# --- Main Game Loop ---
-running = True
-while running:
-    current_time = pygame.time.get_ticks()
+renderer = DirtyRenderer(screen, profiler, output=display)
 
-    for ev in pygame.event.get():
-        if ev.type == pygame.QUIT:
-            running = False
-        elif ev.type == pygame.KEYDOWN:
-            if ev.key == pygame.K_ESCAPE:
-                pause_game()
-
-
-            elif ev.key == pygame.K_r:
-                used_cards.clear()
-                shoe = create_shoe()
-                random.shuffle(shoe)
-                show_popup_message("Deck reshuffled & count reset!")
-            elif game_phase == 'insurance' and ev.key in (pygame.K_y, pygame.K_n):
-                handle_insurance('Y' if ev.key == pygame.K_y else 'N')
-            elif game_phase == 'count_check':
-                if ev.key == pygame.K_BACKSPACE:
-                    count_input = count_input[:-1]
-                elif ev.key == pygame.K_RETURN:
-                    running_count = sum(1 if r in ['2','3','4','5','6'] else -1 for r, _ in used_cards)
-                    if count_input.lstrip('-').isdigit() and int(count_input) == running_count:
-                        round_result = "Correct!"
-                        game_phase = "round_over"
-                    else:
-                        round_result = f"Incorrect! Count was {running_count}. You lose your bet."
-                        chip_count = max(0, chip_count - current_bet)
-                        current_bet = 0
-                        save_chips(chip_count)
-                        game_phase = "game_over"
-                elif ev.unicode.isdigit() or (ev.unicode == '-' and not count_input):
-                    count_input += ev.unicode
-            elif count_check_paused and ev.key == pygame.K_SPACE:
-                game_phase = "count_check"
-                count_check_paused = False
-
-
-        elif ev.type == pygame.MOUSEBUTTONDOWN:
-            if game_phase == "betting":
-                for k, pos in chip_button_positions.items():
-                    chip_rect = pygame.Rect(*pos, 100, 100)
-                    if chip_rect.collidepoint(ev.pos):
-                        add_bet(k)
-                deal_button.is_clicked(ev)
-                clear_button.is_clicked(ev)
-            elif game_phase == "playing":
-                hit_button.is_clicked(ev)
-                stand_button.is_clicked(ev)
-                double_button.is_clicked(ev)
-                split_button.is_clicked(ev)
-                check_count_button.is_clicked(ev)
-
-            elif game_phase in ("round_over", "game_over"):
-                new_round_button.is_clicked(ev)
-
-        elif ev.type == pygame.USEREVENT:
-            if game_phase == "round_over":
-                pygame.time.set_timer(pygame.USEREVENT, 0)
-                count_input = ""
-                count_check_paused = True  # pause before enabling count input
-
-
-    # --- Rendering ---
-    draw_table()
-    draw_hand_values()
-
-
-    # --- Animate Player Card Queue ---
-    if game_phase in ("playing", "player_doubling") and player_card_queue:
-        if current_time - card_draw_timer > CARD_DRAW_INTERVAL:
-            card = player_card_queue.pop(0)
-            player_hand.append(card)
-            card_draw_timer = current_time
-
-        if not player_card_queue:
-            # If bust after draw
-            if calculate_hand(player_hand) > 21:
-                finish_round()
-            elif game_phase == "player_doubling":
-                finish_round()
-
-    # --- Animate Dealer Drawing ---
-    elif game_phase == "dealer_drawing":
-        if dealer_card_queue:
-            if current_time - card_draw_timer > CARD_DRAW_INTERVAL:
-                dealer_hand.append(dealer_card_queue.pop(0))
-                card_draw_timer = current_time
+# --- Main Game Loop ---
+# Guarded so tools such as blackjack_bench.py can load the table without playing
+if __name__ == "__main__":
+    running = True
+    woke = []  # event that ended an idle wait, handled first
+    last_drawn = 0
+    logic_offset = logic_now - pygame.time.get_ticks()
+    while running:
+        profiler.begin_frame()
+        if REMOTE:
+            sync_remote()
+        if turbo is None:
+            advance_logic(pygame.time.get_ticks())
         else:
-            if not player_hand or not dealer_hand:
-                round_result = "Error: One or both hands are missing."
-                game_phase = "game_over"
-                current_bet = 0
-                save_chips(chip_count)
-            else:
-                dealer_value = calculate_hand(dealer_hand)
-                player_value = calculate_hand(player_hand)
-
-            if player_value > 21:
-                round_result = "Bust! You lose."
-                # No payout, already deducted
-            elif dealer_value > 21:
-                round_result = "Dealer busts! You win!"
-                chip_count += current_bet * 2
-            elif player_value > dealer_value:
-                round_result = "You win!"
-                chip_count += current_bet * 2
-            elif player_value == dealer_value:
-                round_result = "Push."
-                chip_count += current_bet
-            else:
-                round_result = "You lose."
-                # No payout
-
-            save_chips(chip_count)
-            current_bet = 0
-            pygame.time.set_timer(pygame.USEREVENT, 3000)
-            game_phase = "round_over"
-
-
-    # --- Prompts ---
-    if game_phase == 'insurance':
-        txt = font.render("Insurance? (Y/N)", True, (255,255,255))
-        screen.blit(txt, (WIDTH//2 - txt.get_width()//2, HEIGHT//2))
-
-    if game_phase == "count_check":
-        prompt = font.render("Enter running count:", True, (255,255,255))
-        inp = font.render(count_input, True, (255,255,0))
-        screen.blit(prompt, (WIDTH//2 - prompt.get_width()//2, HEIGHT//2 - 60))
-        screen.blit(inp, (WIDTH//2 - inp.get_width()//2, HEIGHT//2))
-
-    if count_check_paused:
-        msg = font.render("Press SPACE to begin count check", True, (255, 255, 255))
-        screen.blit(msg, (WIDTH//2 - msg.get_width()//2, HEIGHT//2))
+            for _ in range(turbo or TURBO_BATCH):
+                logic_step()
+        profiler.lap("logic")
 
-    pygame.display.flip()
-    clock.tick(30)
-pygame.quit()
\ No newline at end of file
+        for ev in woke + pygame.event.get():
+            if ev.type in REDRAW_EVENTS:
+                renderer.invalidate()
+            if ev.type == pygame.QUIT:
+                running = False
+            elif ev.type == pygame.KEYDOWN:
+                if ev.key == pygame.K_ESCAPE:
+                    pause_game()
+
+
+                elif ev.key == pygame.K_F2:
+                    show_sprite_stats = not show_sprite_stats
+
+                elif ev.key == pygame.K_F3:
+                    profiler.toggle_hud()
+
+                elif ev.key == pygame.K_F6:
+                    toggle_trace()
+
+                elif ev.key == pygame.K_F5:
+                    show_ev = not show_ev
+
+                elif ev.key == pygame.K_F4:
+                    speed = ANIMATION_SPEEDS[(ANIMATION_SPEEDS.index(timeline.speed) + 1) % len(ANIMATION_SPEEDS)]
+                    timeline.speed = speed
+                    show_popup_message(f"Animation speed: {speed}x" if speed else "Animations off", duration=1000)
+
+                elif ev.key == pygame.K_F7:
+                    autoplay = not autoplay
+                    timeline.cancel("autoplay")
+                    show_popup_message(f"Autoplay {'on' if autoplay else 'off'}", duration=1000)
+
+                elif ev.key == pygame.K_F9:
+                    show_session_stats = not show_session_stats
+
+                elif ev.key == pygame.K_F8:
+                    set_turbo(TURBO_MODES[(TURBO_MODES.index(turbo) + 1) % len(TURBO_MODES)] if turbo in TURBO_MODES else None)
+
+                elif ev.key == pygame.K_r:
+                    table.shoe.reshuffle()
+                    show_popup_message("Deck reshuffled & count reset!")
+                elif game_phase == 'playing' and ev.key == pygame.K_u:
+                    actions.undo_hit()
+                elif game_phase == 'insurance' and ev.key in (pygame.K_y, pygame.K_n):
+                    actions.insurance('Y' if ev.key == pygame.K_y else 'N')
+                elif game_phase == 'count_check':
+                    if ev.key == pygame.K_BACKSPACE:
+                        count_input = count_input[:-1]
+                    elif ev.key == pygame.K_RETURN:
+                        actions.submit_count()
+                    elif ev.unicode.isdigit() or (ev.unicode == '-' and not count_input):
+                        count_input += ev.unicode
+                elif count_check_paused and ev.key == pygame.K_SPACE:
+                    actions.count_check()
+
+
+            elif ev.type == pygame.MOUSEBUTTONDOWN:
+                ev = pygame.event.Event(ev.type, dict(ev.dict, pos=to_canvas(ev.pos)))
+                if game_phase == "betting":
+                    for k, pos in chip_button_positions.items():
+                        chip_rect = pygame.Rect(*pos, CHIP_SIZE, CHIP_SIZE)
+                        if chip_rect.collidepoint(ev.pos):
+                            actions.add_bet(k)
+                    deal_button.is_clicked(ev)
+                    clear_button.is_clicked(ev)
+                elif game_phase == "playing":
+                    hit_button.is_clicked(ev)
+                    stand_button.is_clicked(ev)
+                    double_button.is_clicked(ev)
+                    split_button.is_clicked(ev)
+                    check_count_button.is_clicked(ev)
+
+                elif game_phase in ("round_over", "game_over"):
+                    new_round_button.is_clicked(ev)
+
+
+        profiler.lap("events")
+        if turbo == 0 and pygame.time.get_ticks() - last_drawn < 1000:
+            continue  # drawing is off; show progress once a second
+        last_drawn = pygame.time.get_ticks()
+
+        # --- Rendering ---
+        draw_table()
+        draw_hand_values()
+
+
+        # --- Prompts ---
+        if game_phase == 'insurance':
+            add_centered_text("insurance_prompt", "Insurance? (Y/N)", (255,255,255), HEIGHT//2)
+
+        if game_phase == "count_check":
+            add_centered_text("count_prompt", "Enter running count:", (255,255,255), HEIGHT//2 - px(60))
+            add_centered_text("count_input", count_input, (255,255,0), HEIGHT//2)
+
+        if count_check_paused:
+            add_centered_text("count_paused", "Press SPACE to begin count check", (255, 255, 255), HEIGHT//2)
+
+        if show_ev and game_phase == "playing":
+            draw_ev_overlay()
+
+        if popup_message:
+            draw_popup()
+
+        if show_sprite_stats:
+            add_text("sprite_stats", f"Sprite allocs/frame: {sprites.frame_allocations} | "
+                     f"cached: {len(sprites.surfaces)} ({sprites.bytes // 1024} KB)", (255,255,0), (WIDTH - px(600), px(20)))
+            add_text("text_stats", f"Text hits/misses: {texts.frame_hits}/{texts.frame_misses} | "
+                     f"cached: {len(texts.surfaces)}", (255,255,0), (WIDTH - px(600), px(50)))
+
+        if profiler.show:
+            draw_profile_hud()
+
+        if show_session_stats:
+            draw_session_stats()
+
+        if autoplay or turbo is not None:
+            draw_autoplay_status()
+
+        profiler.lap("build")
+        dirty = renderer.present()  # laps "draw" before pushing to the display
+        profiler.lap("flip")
+        surface_allocs = sprites.end_frame()
+        text_hits, text_misses = texts.end_frame()
+        # Full rate while something is changing; otherwise block until there's work.
+        # Turbo never waits.
+        if turbo is not None:
+            clock.tick()
+            woke = []
+        elif dirty or profiler.show:
+            clock.tick(FPS)
+            woke = []
+        else:
+            woke = wait_idle()
+        profiler.lap("wait")
+        profiler.end_frame(game_phase, blits=renderer.blits, surface_allocs=surface_allocs,
+                           text_hits=text_hits, text_misses=text_misses)
+    profiler.stop_recording()
+    pygame.quit()
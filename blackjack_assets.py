@@ -0,0 +1,140 @@
+"""Image loading: parallel PNG decode, display-format conversion, atlas cache.
+
+The first launch decodes and scales every image in a thread pool and writes
+the scaled pixels to one atlas file. Later launches mmap that file and wrap
+each image straight from it, skipping PNG decode and scaling. The atlas is
+keyed on every source path, mtime and target size, so editing or resizing
+any image rebuilds it. Each set of target sizes (one per internal
+resolution) keeps its own atlas, and a rebuild only replaces atlases of
+the same sizes; at most MAX_ATLASES are kept in all.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pygame
+
+CACHE_FOLDER = ".asset_cache"
+ATLAS_MAGIC = b"BJATLAS1"
+MAX_ATLASES = 4
+
+
+class AssetJob:
+    def __init__(self, name, path, size, alpha=True):
+        self.name = name
+        self.path = path
+        self.size = tuple(size)
+        self.alpha = alpha  # False for opaque images like the felt
+
+
+def _atlas_path(jobs, cache_dir):
+    # atlas-<names and sizes>-<sources>.bin, so atlases for other sizes survive a rebuild
+    sizes, h = hashlib.sha1(), hashlib.sha1()
+    for job in jobs:
+        st = os.stat(job.path)
+        sizes.update(f"{job.name}|{job.size}\n".encode())
+        h.update(f"{job.name}|{job.path}|{st.st_mtime_ns}|{st.st_size}|{job.size}\n".encode())
+    return os.path.join(cache_dir, f"atlas-{sizes.hexdigest()[:8]}-{h.hexdigest()[:16]}.bin")
+
+
+def _decode(job):
+    return pygame.transform.scale(pygame.image.load(job.path), job.size)
+
+
+def _read_atlas(path):
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(ATLAS_MAGIC)] != ATLAS_MAGIC:
+        mm.close()
+        raise ValueError(f"{path} is not an asset atlas")
+    start = len(ATLAS_MAGIC) + 4
+    (index_len,) = struct.unpack_from("<I", mm, len(ATLAS_MAGIC))
+    index = json.loads(mm[start:start + index_len])
+    base = start + index_len
+    view = memoryview(mm)
+    images = {}
+    for name, (offset, w, h) in index.items():
+        # frombuffer wraps the mapped pixels without copying them
+        lo = base + offset
+        images[name] = pygame.image.frombuffer(view[lo:lo + w * h * 4], (w, h), "RGBA")
+    return images, mm
+
+
+def _write_atlas(path, images):
+    index, blobs, offset = {}, [], 0
+    for name, surf in images.items():
+        w, h = surf.get_size()
+        blobs.append(pygame.image.tobytes(surf, "RGBA"))
+        index[name] = (offset, w, h)
+        offset += w * h * 4
+    index_bytes = json.dumps(index).encode()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(ATLAS_MAGIC)
+        f.write(struct.pack("<I", len(index_bytes)))
+        f.write(index_bytes)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, path)
+
+    # Older atlases of the same sizes are never read again; others are kept up to MAX_ATLASES
+    folder, name = os.path.split(path)
+    prefix = name[:len("atlas-") + 9]
+    others = [f for f in os.listdir(folder) if f.startswith("atlas-") and f.endswith(".bin") and f != name]
+    others.sort(key=lambda f: os.path.getmtime(os.path.join(folder, f)), reverse=True)
+    for i, old in enumerate(others):
+        if old.startswith(prefix) or i >= MAX_ATLASES - 1:
+            try:
+                os.remove(os.path.join(folder, old))
+            except OSError:
+                pass
+
+
+def load_assets(jobs, cache_dir=CACHE_FOLDER, on_progress=None, workers=None):
+    """Return {name: Surface} in display format for every job.
+
+    on_progress(done, total) is called on the calling thread as images come
+    in, so it may draw a loading screen. The display mode must already be set.
+    """
+    jobs = list(jobs)
+    total = len(jobs)
+    atlas = _atlas_path(jobs, cache_dir)
+    raw, mm = None, None
+
+    if os.path.exists(atlas):
+        try:
+            raw, mm = _read_atlas(atlas)
+        except (OSError, ValueError):
+            raw = None
+        if raw is not None and set(raw) != {job.name for job in jobs}:
+            raw = None
+
+    if raw is None:
+        raw = {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_decode, job): job for job in jobs}
+            for fut in as_completed(futures):
+                raw[futures[fut].name] = fut.result()
+                if on_progress:
+                    on_progress(len(raw), total * 2)
+        try:
+            _write_atlas(atlas, raw)
+        except OSError:
+            pass  # a read-only install just decodes every launch
+
+    # Converting copies the pixels out of the mapping into the display format
+    images = {}
+    for i, job in enumerate(jobs):
+        src = raw.pop(job.name)
+        images[job.name] = src.convert_alpha() if job.alpha else src.convert()
+        del src
+        if on_progress:
+            on_progress(total + i + 1, total * 2)
+    if mm is not None:
+        mm.close()
+    return images
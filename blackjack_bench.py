@@ -0,0 +1,297 @@
+"""Headless benchmarks for the game, written to JSON for comparing versions.
+
+    python blackjack_bench.py --out bench.json
+    python blackjack_bench.py --out new.json --compare bench.json
+
+Runs under SDL's dummy video driver. It measures, for each table state,
+the frame time of draw_table() + draw_hand_values() (building the frame),
+of presenting the changed regions, and of a full repaint. It also
+measures calculate_hand and draw_count calls per second, full rounds per
+second with animations off, and cold and warm startup through asset
+loading. If the card or chip art is not in --assets (by default the
+game's folder), placeholder images are generated so the numbers stay
+comparable.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ["BLACKJACK_STATS_CSV"] = ""  # the bench's rounds are not a session; export nothing
+
+import pygame
+
+from blackjack_engine import Shoe, Table, make_card
+from blackjack_strategy import Strategy
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+GAME = os.path.join(HERE, "BlackJack1.0.py")
+CHIPS = ["chip_black", "chip_green", "chip_blue", "chip_red", "chip_white"]
+TOLERANCE = 0.25  # frame times under a millisecond are noisy
+
+
+def prepare_assets(src, dest):
+    """Copy src's images into dest, generating any that are missing."""
+    cards = os.path.join(dest, "Cards (large)")
+    os.makedirs(cards, exist_ok=True)
+    if os.path.isdir(os.path.join(src, "Cards (large)")):
+        shutil.copytree(os.path.join(src, "Cards (large)"), cards, dirs_exist_ok=True)
+    if not os.path.exists(os.path.join(cards, "card_back.png")):
+        pygame.init()
+        img = pygame.Surface((500, 726))
+        for i, name in enumerate(["card_back"] + [f"card_{s}_{r}" for s in ("hearts", "diamonds", "clubs", "spades")
+                                                  for r in ("02", "03", "04", "05", "06", "07", "08", "09", "10", "J", "Q", "K", "A")]):
+            img.fill((40 + i * 3, 40, 200 - i * 2))
+            pygame.image.save(img, os.path.join(cards, name + ".png"))
+    for i, k in enumerate(CHIPS):
+        path = os.path.join(src, f"{k}.png")
+        if os.path.exists(path):
+            shutil.copy(path, dest)
+        else:
+            pygame.init()
+            img = pygame.Surface((200, 200), pygame.SRCALPHA)
+            pygame.draw.circle(img, (200 - i * 30, 60 + i * 30, 60), (100, 100), 100)
+            pygame.image.save(img, os.path.join(dest, f"{k}.png"))
+    with open(os.path.join(dest, "chips.json"), "w") as f:
+        json.dump({"chips": 10 ** 9}, f)
+
+
+def load_game():
+    # Runs the module top level (window, assets, table) but not the main loop.
+    # run_path returns a copy of the globals; the functions' own dict is the
+    # live one, so state set through it is seen by the game code.
+    import runpy
+    sys.path.insert(0, HERE)
+    return runpy.run_path(GAME, run_name="blackjack_gui")["draw_table"].__globals__
+
+
+def timings(fn, frames):
+    samples = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {"mean_ms": statistics.fmean(samples), "p99_ms": samples[int(len(samples) * 0.99) - 1]}
+
+
+def set_state(g, state):
+    table, rnd = g["table"], g["table"].round
+    g["hidden_cards"].clear()
+    g["split_active"] = False
+    rnd.clear()
+    table.new_round()
+    if state == "betting":
+        g["game_phase"] = "betting"
+        table.add_bet(1000)
+        return
+    table.add_bet(1000)
+    table.deal()
+    if state == "playing_split":
+        rnd.split_hand.extend([table.shoe.draw(), table.shoe.draw()])
+        g["split_active"] = True
+        g["game_phase"] = "playing"
+    elif state == "dealer_drawing":
+        g["game_phase"] = "dealer_drawing"
+        table.finish()
+    elif state == "round_over":
+        table.finish()
+        table.settle()
+        rnd.result = "Dealer busts! You win!"
+        g["game_phase"] = "round_over"
+
+
+def bench_frames(g, frames):
+    results = {}
+    renderer = g["renderer"]
+    for state in ("betting", "playing_split", "dealer_drawing", "round_over"):
+        set_state(g, state)
+
+        def build():
+            g["draw_table"]()
+            g["draw_hand_values"]()
+            renderer.elements = []
+
+        def dirty():
+            g["draw_table"]()
+            g["draw_hand_values"]()
+            renderer.present()
+
+        def full():
+            renderer.invalidate()
+            dirty()
+
+        dirty()
+        results[state] = {"build": timings(build, frames), "present": timings(dirty, frames),
+                          "full_repaint": timings(full, max(frames // 10, 10))}
+    return results
+
+
+def bench_calls(g):
+    calculate_hand = g["calculate_hand"]
+    hand = [make_card("A", "spades"), make_card("7", "hearts"), make_card("K", "clubs")]
+    n, secs = timeit.Timer(lambda: calculate_hand(hand)).autorange()
+    out = {"calculate_hand_per_s": n / secs}
+
+    renderer = g["renderer"]
+
+    def count():
+        g["draw_count"]()
+        renderer.elements.clear()
+    n, secs = timeit.Timer(count).autorange()
+    out["draw_count_per_s"] = n / secs
+
+    # The engine alone, as the simulator plays it
+    table = Table(shoe=Shoe(rng=random.Random(0)), chips=1 << 62, ai_strategy=Strategy())
+    n, secs = timeit.Timer(lambda: table.play_round(2)).autorange()
+    out["engine_rounds_per_s"] = n / secs
+
+    # Undo, rewind and lookahead all take a snapshot and restore it
+    n, secs = timeit.Timer(lambda: table.restore(table.snapshot())).autorange()
+    out["snapshot_restore_per_s"] = n / secs
+    return out
+
+
+def bench_rounds(g, seconds):
+    # Full GUI state machine with the timeline skipping every animation
+    g["timeline"].speed = 0
+    table = g["table"]
+    clock = [0]
+
+    def run_until(done):
+        while not done():
+            clock[0] += 1
+            g["timeline"].update(clock[0])
+            g["draw_table"]()
+            g["draw_hand_values"]()
+            g["renderer"].present()
+
+    rounds, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        g["game_phase"] = "betting"
+        table.new_round()
+        g["add_bet"]("chip_white")
+        g["deal_action"]()
+        run_until(lambda: g["game_phase"] != "dealing")
+        if g["game_phase"] == "insurance":
+            g["handle_insurance"]("N")
+        if g["game_phase"] == "playing":
+            g["stand_action"]()
+            run_until(lambda: g["game_phase"] == "round_over")
+        rounds += 1
+    return {"rounds_per_s": rounds / (time.perf_counter() - start)}
+
+
+STARTUP = """
+import os, sys, time, runpy
+t0 = time.perf_counter()
+sys.path.insert(0, {here!r})
+g = runpy.run_path({game!r}, run_name="blackjack_gui")
+g["draw_table"](); g["draw_hand_values"](); g["renderer"].present()
+print(time.perf_counter() - t0)
+"""
+
+
+def bench_startup(workdir):
+    code = STARTUP.format(here=HERE, game=GAME)
+    out = {}
+    for label in ("cold", "warm"):
+        if label == "cold":
+            shutil.rmtree(os.path.join(workdir, ".asset_cache"), ignore_errors=True)
+        start = time.perf_counter()
+        res = subprocess.run([sys.executable, "-c", code], cwd=workdir, capture_output=True, text=True, check=True)
+        out[label] = {"first_frame_s": float(res.stdout.strip().splitlines()[-1]),
+                      "process_s": time.perf_counter() - start}
+    return out
+
+
+def flatten(d, prefix=""):
+    for k, v in d.items():
+        if isinstance(v, dict):
+            yield from flatten(v, f"{prefix}{k}.")
+        else:
+            yield f"{prefix}{k}", v
+
+
+def compare(new, old, tolerance=TOLERANCE):
+    """Print metrics that got worse than the baseline; returns how many."""
+    old_flat = dict(flatten(old["results"]))
+    bad = 0
+    for key, value in flatten(new["results"]):
+        base = old_flat.get(key)
+        if not base:
+            continue
+        # Rates are better higher, times better lower
+        ratio = base / value if key.endswith("_per_s") else value / base
+        if ratio > 1 + tolerance:
+            bad += 1
+            print(f"REGRESSION {key}: {base:.4g} -> {value:.4g} ({ratio:.2f}x worse)")
+    return bad
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the blackjack game headlessly.")
+    parser.add_argument("--assets", default=HERE, help="folder with 'Cards (large)' and the chip images")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--round-seconds", type=float, default=5.0)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--resolution", help="internal render resolution such as 1280x720 (BLACKJACK_RESOLUTION)")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown before a regression is flagged")
+    args = parser.parse_args(argv)
+    if args.resolution:
+        os.environ["BLACKJACK_RESOLUTION"] = args.resolution
+
+    workdir = tempfile.mkdtemp(prefix="blackjack-bench-")
+    try:
+        prepare_assets(args.assets, workdir)
+        results = {"startup": bench_startup(workdir)}
+        os.chdir(workdir)
+        g = load_game()
+        results["frames"] = bench_frames(g, args.frames)
+        results["calls"] = bench_calls(g)
+        results["rounds"] = bench_rounds(g, args.round_seconds)
+        g["store"].close()
+    finally:
+        os.chdir(HERE)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "resolution": os.environ.get("BLACKJACK_RESOLUTION"),
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    for key, value in flatten(results):
+        print(f"{key:45} {value:12.4f}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(report, json.load(f), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
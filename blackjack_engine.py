@@ -0,0 +1,615 @@
+"""Blackjack rules without pygame, shared by the GUI and simulations.
+
+A card is an int 0..51, suit * 13 + rank index, and a shoe is an
+array('B') of them. Values and count tags come from tables indexed by the
+card; only the GUI turns cards back into names, to find their images.
+"""
+import copy
+import queue
+import random
+import threading
+from array import array
+
+NUM_DECKS = 6
+NUM_AI_PLAYERS = 2
+STARTING_CHIPS = 100
+CHIP_VALUES = {"chip_black": 1000, "chip_green": 500, "chip_blue": 100, "chip_red": 50, "chip_white": 25}
+RESHUFFLE_AT = 52  # default cut card: reshuffle before a deal once fewer cards than this remain
+
+# Card data
+suits = ['hearts','diamonds','clubs','spades']
+ranks = ['2','3','4','5','6','7','8','9','10','J','Q','K','A']
+card_values = {'2':2,'3':3,'4':4,'5':5,'6':6,'7':7,'8':8,'9':9,'10':10,'J':10,'Q':10,'K':10,'A':11}
+rank_index = {r: i for i, r in enumerate(ranks)}
+DECK_SIZE = 52
+ACE = rank_index['A']
+CARD_RANK = bytes(c % 13 for c in range(DECK_SIZE))  # card -> rank index
+CARD_VALUE = bytes(card_values[ranks[c % 13]] for c in range(DECK_SIZE))  # card -> points, ace 11
+DECK = array('B', range(DECK_SIZE))
+
+# Card counting tags per rank, in the order of ranks (2..10, J, Q, K, A)
+COUNT_SYSTEMS = {
+    "hi-lo":    (1, 1, 1, 1, 1, 0, 0, 0, -1, -1, -1, -1, -1),
+    "ko":       (1, 1, 1, 1, 1, 1, 0, 0, -1, -1, -1, -1, -1),
+    "omega-ii": (1, 1, 2, 2, 2, 1, 0, -1, -2, -2, -2, -2, 0),
+}
+
+
+def make_card(rank, suit):
+    return suits.index(suit) * 13 + rank_index[rank]
+
+
+def card_name(card):
+    """'A_spades' style name, as used for the card images."""
+    return f"{ranks[card % 13]}_{suits[card // 13]}"
+
+
+def calculate_hand(hand):
+    value, aces = 0, 0
+    for c in hand:
+        v = CARD_VALUE[c]
+        value += v
+        if v == 11:
+            aces += 1
+    while value > 21 and aces:
+        value -= 10
+        aces -= 1
+    return value
+
+
+def is_soft(hand):
+    """True when an ace in the hand still counts as 11."""
+    raw = sum(CARD_VALUE[c] for c in hand)
+    return raw - calculate_hand(hand) < 10 * sum(CARD_VALUE[c] == 11 for c in hand)
+
+
+class Rules:
+    """The table rules in one place; Rules() is the game as the GUI plays it.
+
+    blackjack_pays is (3, 2) or (6, 5). insurance_pays is what a winning
+    insurance bet returns per chip staked, stake included; the game's "2:1"
+    returns twice the stake, so it nets even money. double_on is "any" (any hand, even
+    after hitting), "two" (first two cards), or "9-11" / "10-11" (first two
+    cards totalling that). Splitting allows one split of a pair; surrender
+    gives up half the bet on the first two cards. as_dict() gives the
+    fields as plain values, for saving and for keying sweep results.
+    """
+    __slots__ = ("decks", "penetration", "hit_soft_17", "blackjack_pays", "insurance_pays",
+                 "double_on", "split", "double_after_split", "surrender")
+
+    def __init__(self, decks=NUM_DECKS, penetration=None, hit_soft_17=False, blackjack_pays=(3, 2),
+                 insurance_pays=2, double_on="any", split=False, double_after_split=False, surrender=False):
+        self.decks = decks
+        self.penetration = penetration  # None puts the cut card RESHUFFLE_AT cards from the back
+        self.hit_soft_17 = hit_soft_17
+        self.blackjack_pays = tuple(blackjack_pays)
+        self.insurance_pays = insurance_pays
+        self.double_on = double_on
+        self.split = split
+        self.double_after_split = double_after_split
+        self.surrender = surrender
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def replace(self, **changes):
+        return Rules(**{**self.as_dict(), **changes})
+
+    def __eq__(self, other):
+        return isinstance(other, Rules) and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return "Rules(" + ", ".join(f"{k}={v!r}" for k, v in self.as_dict().items()) + ")"
+
+
+def create_shoe(num_decks=NUM_DECKS):
+    return DECK * num_decks
+
+
+class CountTracker:
+    """Running count and remaining composition, updated one card at a time.
+
+    Every query is O(1) so the GUI can show the count every frame without
+    rescanning the discards. KO is unbalanced and starts from 4 - 4 * decks
+    so its pivot lands on zero.
+    """
+    def __init__(self, num_decks=NUM_DECKS, system="hi-lo"):
+        self.num_decks = num_decks
+        self.system = system
+        self.tags = COUNT_SYSTEMS[system]
+        self.card_tags = [self.tags[r] for r in CARD_RANK]
+        self.start = 4 - 4 * num_decks if system == "ko" else 0
+        self.reset()
+
+    def reset(self):
+        self.running = self.start
+        self.remaining = [4 * self.num_decks] * len(ranks)
+        self.cards_left = 52 * self.num_decks
+
+    def see(self, card):
+        self.running += self.card_tags[card]
+        self.remaining[CARD_RANK[card]] -= 1
+        self.cards_left -= 1
+
+    def decks_remaining(self):
+        return max(self.cards_left / 52, 1)
+
+    def true_count(self):
+        return self.running / self.decks_remaining()
+
+
+class ShoeStream:
+    """Shuffled shoes made one after another on demand.
+
+    With a seed, shoe i of the stream is shuffled from its own generator
+    derived from (seed, i), so a seeded stream replays the same shoes on
+    every run, inline or through a ShoePool.
+    """
+    def __init__(self, num_decks=NUM_DECKS, seed=None, rng=None):
+        self.num_decks = num_decks
+        self.seed = seed
+        self.rng = rng or random.Random()
+        self.fresh = create_shoe(num_decks)
+        self.index = 0
+
+    def next_shoe(self):
+        rng = self.rng if self.seed is None else random.Random(f"shoe:{self.seed}:{self.index}")
+        self.index += 1
+        # Sorting on random keys is an unbiased shuffle and far cheaper than
+        # random.shuffle's per-card _randbelow calls.
+        rand = rng.random
+        return array('B', sorted(self.fresh, key=lambda _: rand()))
+
+    def fork(self):
+        """A stream that goes on to deal the same shoes as this one, without drawing from it."""
+        stream = copy.copy(self)
+        stream.rng = random.Random()
+        stream.rng.setstate(self.rng.getstate())
+        return stream
+
+
+class ShoePool:
+    """Keeps the next few shoes of a stream shuffled by a background thread.
+
+    next_shoe() takes a ready shoe off the queue, so a reshuffle is a swap
+    rather than a shuffle in the middle of the game. The stream's order is
+    kept, so a seeded pool deals the same shoes as the seeded stream.
+    """
+    def __init__(self, stream=None, ahead=2):
+        self.stream = stream or ShoeStream()
+        self.num_decks = self.stream.num_decks
+        self.taken = 0  # shoes handed out; the thread runs ahead of this
+        self._ready = queue.Queue(maxsize=ahead)
+        self._thread = threading.Thread(target=self._run, name="shoe-pool", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._ready.put(self.stream.next_shoe())
+
+    def next_shoe(self):
+        self.taken += 1
+        return self._ready.get()
+
+    def fork(self):
+        """An inline stream for a forked table. A seeded one picks up at the shoe this pool deals next."""
+        stream = ShoeStream(self.num_decks, self.stream.seed)
+        stream.index = self.taken if self.stream.seed is not None else 0
+        return stream
+
+
+class Shoe:
+    """The cards left to deal, a cut card and the count of what has been dealt.
+
+    penetration is the fraction of the shoe dealt before the cut card comes
+    out; by default the cut card sits RESHUFFLE_AT cards from the back. Past
+    the cut card the round is finished and the next deal starts a new shoe.
+    Shoes come from source (a ShoeStream or ShoePool).
+
+    Cards are dealt from the end of cards, and left says how many are
+    still to come. cards itself never changes once dealing starts. A new
+    shoe or shuffle_rest() replaces it instead, so snapshots can share it.
+    """
+    def __init__(self, num_decks=NUM_DECKS, rng=None, count_system="hi-lo", penetration=None,
+                 seed=None, source=None):
+        self.source = source or ShoeStream(num_decks, seed, rng)
+        self.num_decks = num_decks = self.source.num_decks
+        self.count = CountTracker(num_decks, count_system)
+        size = DECK_SIZE * num_decks
+        self.cut = RESHUFFLE_AT if penetration is None else max(size - int(size * penetration), 1)
+        self.cards = array('B')
+        self.left = 0
+        self.reshuffle()
+
+    def __len__(self):
+        return self.left
+
+    def reshuffle(self):
+        self.cards = self.source.next_shoe()
+        self.left = len(self.cards)
+        self.count.reset()
+
+    def past_cut(self):
+        return self.left < self.cut
+
+    def draw(self):
+        if not self.left:
+            self.reshuffle()  # ran past the end of a deep cut mid-round
+        self.left -= 1
+        card = self.cards[self.left]
+        self.count.see(card)
+        return card
+
+    def shuffle_rest(self, rng):
+        """Shuffle the cards still to come into a new array, leaving the old one to snapshots."""
+        rest = self.cards[:self.left]
+        rng.shuffle(rest)
+        self.cards = rest
+
+
+class Round:
+    """Hands and wagers for a single deal. Hand lists are reused between rounds."""
+    def __init__(self, num_ai_players=NUM_AI_PLAYERS):
+        self.player_hand = []
+        self.split_hand = []
+        self.dealer_hand = []
+        self.ai_hands = [[] for _ in range(num_ai_players)]
+        self.bet = 0
+        self.split_bet = 0  # bet on split_hand, once the player splits
+        self.insurance_bet = 0
+        self.result = ""
+        self.phase = "betting"  # "betting", "insurance", "playing", "dealer", "over"
+        # What happened, for the hand history
+        self.actions = []  # "hit", "stand", "double", "split", "surrender", "insurance", "no_insurance"
+        self.stake = 0  # main bet including a double
+        self.payout = 0  # everything paid back to the player
+        self.count_at_deal = 0
+        self.cards_left_at_deal = 0
+
+    def clear(self):
+        self.player_hand.clear()
+        self.split_hand.clear()
+        self.dealer_hand.clear()
+        for h in self.ai_hands:
+            h.clear()
+        self.split_bet = 0
+        self.insurance_bet = 0
+        self.result = ""
+        self.actions.clear()
+        self.stake = self.payout = 0
+
+    def dealer_upcard(self):
+        return self.dealer_hand[1]
+
+
+class GameState:
+    """Everything about a Table at one moment, from Table.snapshot().
+
+    The shoe's cards are shared with the table rather than copied (see
+    Shoe); the rest is a few short tuples. Taking or restoring a snapshot
+    costs a few microseconds. A restore rewinds within the shoe it was taken
+    in; shoes after that come fresh from the shoe's source.
+    """
+    __slots__ = ("chips", "cards", "left", "running", "remaining", "hands", "bet", "split_bet", "insurance_bet",
+                 "result", "phase", "actions", "stake", "payout", "count_at_deal", "cards_left_at_deal")
+
+    def __init__(self, table):
+        shoe, count, r = table.shoe, table.shoe.count, table.round
+        self.chips = table.chip_count
+        self.cards = shoe.cards
+        self.left = shoe.left
+        self.running = count.running
+        self.remaining = tuple(count.remaining)
+        self.hands = (tuple(r.player_hand), tuple(r.split_hand), tuple(r.dealer_hand)) + tuple(map(tuple, r.ai_hands))
+        self.bet = r.bet
+        self.split_bet = r.split_bet
+        self.insurance_bet = r.insurance_bet
+        self.result = r.result
+        self.phase = r.phase
+        self.actions = tuple(r.actions)
+        self.stake = r.stake
+        self.payout = r.payout
+        self.count_at_deal = r.count_at_deal
+        self.cards_left_at_deal = r.cards_left_at_deal
+
+    def apply(self, table):
+        # Hands are refilled in place, since the GUI holds on to the lists
+        shoe, count, r = table.shoe, table.shoe.count, table.round
+        table.chip_count = self.chips
+        shoe.cards = self.cards
+        shoe.left = self.left
+        count.running = self.running
+        count.remaining[:] = self.remaining
+        count.cards_left = self.left
+        for hand, cards in zip([r.player_hand, r.split_hand, r.dealer_hand] + r.ai_hands, self.hands):
+            hand[:] = cards
+        r.bet = self.bet
+        r.split_bet = self.split_bet
+        r.insurance_bet = self.insurance_bet
+        r.result = self.result
+        r.phase = self.phase
+        r.actions[:] = self.actions
+        r.stake = self.stake
+        r.payout = self.payout
+        r.count_at_deal = self.count_at_deal
+        r.cards_left_at_deal = self.cards_left_at_deal
+
+
+class Table:
+    """A shoe, a chip balance and the round in progress.
+
+    Methods draw straight into the round's hands; the GUI decides when to
+    reveal them. Chip arithmetic matches the original main loop: the bet is
+    taken when placed and wins pay back twice the bet. Payouts and what the
+    player may do come from rules; a shoe passed in keeps its own decks and
+    cut card.
+    """
+    def __init__(self, shoe=None, chips=STARTING_CHIPS, num_ai_players=NUM_AI_PLAYERS, ai_strategy=None,
+                 rules=None):
+        self.rules = rules = rules or Rules()
+        self.shoe = shoe if shoe is not None else Shoe(rules.decks, penetration=rules.penetration)
+        self.chip_count = chips
+        self.round = Round(num_ai_players)
+        self.ai_strategy = ai_strategy  # a blackjack_strategy.Strategy; None hits below 17
+
+    # Betting
+    def add_bet(self, amount):
+        if self.chip_count < amount:
+            return False
+        self.round.bet += amount
+        self.chip_count -= amount
+        return True
+
+    def clear_bet(self):
+        self.chip_count += self.round.bet
+        self.round.bet = 0
+
+    def new_round(self):
+        self.round.bet = 0
+        self.round.phase = "betting"
+
+    # Round flow
+    def deal(self):
+        r = self.round
+        r.clear()
+        if self.shoe.past_cut():
+            self.shoe.reshuffle()
+        r.stake = r.bet
+        r.count_at_deal = self.shoe.count.running
+        r.cards_left_at_deal = len(self.shoe)
+        deal_order = [r.player_hand, r.dealer_hand] + r.ai_hands
+        for _ in range(2):
+            for hand in deal_order:
+                hand.append(self.shoe.draw())
+
+        # Player blackjack pays 3:2 (or as the rules say) unless the dealer shows an ace
+        ace_up = CARD_RANK[r.dealer_hand[1]] == ACE
+        if calculate_hand(r.player_hand) == 21 and not ace_up:
+            win, stake = self.rules.blackjack_pays
+            r.payout = r.bet + r.bet * win // stake
+            self.chip_count += r.payout
+            r.phase = "over"
+        elif ace_up:
+            r.phase = "insurance"
+        else:
+            r.phase = "playing"
+        return r.phase
+
+    def insurance(self, take):
+        r = self.round
+        if take:
+            r.insurance_bet = min(r.bet // 2, self.chip_count)
+            self.chip_count -= r.insurance_bet
+        r.actions.append("insurance" if take else "no_insurance")
+
+        if calculate_hand(r.dealer_hand) == 21:
+            paid = r.insurance_bet * self.rules.insurance_pays
+            r.payout += paid
+            self.chip_count += paid
+            r.result = f'Dealer blackjack! Insurance pays {self.rules.insurance_pays}:1.'
+            r.phase = "over"
+        else:
+            r.result = 'No dealer blackjack.'
+            r.phase = "playing"
+        return r.phase
+
+    def hit(self, action="hit", split=False):
+        self.round.actions.append(action)
+        card = self.shoe.draw()
+        (self.round.split_hand if split else self.round.player_hand).append(card)
+        return card
+
+    def can_double(self, split=False):
+        r = self.rules
+        hand = self.round.split_hand if split else self.round.player_hand
+        if self.round.split_hand and (len(hand) != 2 or not r.double_after_split):
+            return False  # after a split only a fresh two-card hand may double, and only with DAS
+        if r.double_on == "any":
+            return True
+        if len(hand) != 2:
+            return False
+        return r.double_on == "two" or calculate_hand(hand) in {"9-11": (9, 10, 11), "10-11": (10, 11)}[r.double_on]
+
+    def double(self, split=False):
+        r = self.round
+        bet = r.split_bet if split else r.bet
+        if self.chip_count < bet or not self.can_double(split):
+            return None
+        self.chip_count -= bet
+        r.stake += bet
+        if split:
+            r.split_bet *= 2
+        else:
+            r.bet *= 2
+        return self.hit("double", split)
+
+    def can_split(self):
+        hand = self.round.player_hand
+        return (self.rules.split and len(hand) == 2 and not self.round.split_hand
+                and CARD_VALUE[hand[0]] == CARD_VALUE[hand[1]])
+
+    def split(self):
+        """Move the second card to split_hand with an equal bet, then give each hand a card."""
+        r = self.round
+        if not self.can_split() or self.chip_count < r.bet:
+            return False
+        self.chip_count -= r.bet
+        r.stake += r.bet
+        r.split_bet = r.bet
+        r.split_hand.append(r.player_hand.pop())
+        r.actions.append("split")
+        r.player_hand.append(self.shoe.draw())
+        r.split_hand.append(self.shoe.draw())
+        return True
+
+    def can_surrender(self):
+        r = self.round
+        return self.rules.surrender and len(r.player_hand) == 2 and not r.split_hand and r.phase == "playing"
+
+    def surrender(self):
+        """Give up the hand for half the bet back. Returns False if the rules don't allow it."""
+        r = self.round
+        if not self.can_surrender():
+            return False
+        r.actions.append("surrender")
+        r.payout += r.bet // 2
+        self.chip_count += r.bet // 2
+        r.bet = 0
+        r.result = "Surrendered."
+        r.phase = "over"
+        return True
+
+    def play_ai(self):
+        # AI seats never split; a double just takes one card, as they have no chips
+        strategy = self.ai_strategy
+        upcard = self.round.dealer_hand[1]
+        count = self.shoe.count
+        for h in self.round.ai_hands:
+            if strategy is None:
+                while calculate_hand(h) < 17:
+                    h.append(self.shoe.draw())
+                continue
+            strategy.play_hand(h, upcard, count.true_count(), self.shoe.draw)
+
+    def play_dealer(self):
+        """Dealer stands on 17, or hits a soft 17 if the rules say so. Returns the cards drawn."""
+        hand = self.round.dealer_hand
+        start = len(hand)
+        hit_soft_17 = self.rules.hit_soft_17
+        while True:
+            total = calculate_hand(hand)
+            if total > 17 or (total == 17 and not (hit_soft_17 and is_soft(hand))):
+                break
+            hand.append(self.shoe.draw())
+        return hand[start:]
+
+    def finish(self):
+        """AI seats then the dealer play out. Returns the dealer's new cards."""
+        r = self.round
+        if calculate_hand(r.player_hand) <= 21 and (not r.actions or r.actions[-1] != "double"):
+            r.actions.append("stand")
+        self.play_ai()
+        drawn = self.play_dealer()
+        self.round.phase = "dealer"
+        return drawn
+
+    @staticmethod
+    def _settle_hand(hand, bet, dealer_value):
+        # (result, payout) for one of the player's hands
+        player_value = calculate_hand(hand)
+        if player_value > 21:
+            return "Bust! You lose.", 0
+        if dealer_value > 21:
+            return "Dealer busts! You win!", bet * 2
+        if player_value > dealer_value:
+            return "You win!", bet * 2
+        if player_value == dealer_value:
+            return "Push.", bet
+        return "You lose.", 0
+
+    def settle(self):
+        r = self.round
+        dealer_value = calculate_hand(r.dealer_hand)
+        r.result, payout = self._settle_hand(r.player_hand, r.bet, dealer_value)
+        if r.split_hand:
+            result, paid = self._settle_hand(r.split_hand, r.split_bet, dealer_value)
+            r.result = f"{r.result} / {result}"
+            payout += paid
+
+        self.chip_count += payout
+        r.payout += payout
+        r.bet = r.split_bet = 0
+        r.phase = "over"
+        return payout
+
+    # Snapshots
+    def snapshot(self):
+        return GameState(self)
+
+    def restore(self, state):
+        state.apply(self)
+
+    def fork(self, rng=None):
+        """An independent Table at this position, sharing the shoe's cards.
+
+        Without rng the fork deals the shoes the table itself would deal next,
+        from its own copy of the source. With rng the cards still to come are
+        reshuffled (copying just those) and later shoes come from rng, so
+        forks play out different futures.
+        """
+        table = copy.copy(self)
+        table.shoe = copy.copy(self.shoe)
+        table.shoe.count = copy.copy(self.shoe.count)
+        table.shoe.count.remaining = list(self.shoe.count.remaining)
+        table.round = Round(len(self.round.ai_hands))
+        table.restore(self.snapshot())
+        if rng is not None:
+            table.shoe.source = ShoeStream(self.shoe.num_decks, rng=rng)
+            table.shoe.shuffle_rest(rng)
+        else:
+            table.shoe.source = self.shoe.source.fork()
+        return table
+
+    # Headless play
+    def _play_hand(self, strategy, split=False):
+        hand = self.round.split_hand if split else self.round.player_hand
+        upcard = self.round.dealer_hand[1]
+        while True:
+            total = calculate_hand(hand)
+            if total >= 21:
+                return
+            action = strategy(hand, upcard) if strategy else ("hit" if total < 17 else "stand")
+            if action == "hit" or (action == "double" and self.double(split) is None):
+                self.hit(split=split)
+                continue
+            if action == "split" and self.split():
+                if CARD_RANK[hand[0]] != ACE:  # split aces take one card each
+                    self._play_hand(strategy)
+                    self._play_hand(strategy, split=True)
+            elif action == "surrender":
+                self.surrender()
+            return
+
+    def play_round(self, bet, strategy=None, take_insurance=False):
+        """Play a complete round and return the net chip change.
+
+        strategy(hand, upcard) returns "hit", "stand", "double", "split" or
+        "surrender"; the default hits below 17. A move the rules don't allow
+        falls back to hitting (double) or standing (split, surrender).
+        """
+        start = self.chip_count
+        r = self.round
+        r.bet = 0
+        if not self.add_bet(bet):
+            return 0
+        phase = self.deal()
+        if phase == "insurance":
+            phase = self.insurance(take_insurance)
+        if phase == "playing":
+            self._play_hand(strategy)
+            if r.phase == "playing":
+                self.finish()
+                self.settle()
+        r.bet = 0
+        r.phase = "betting"
+        return self.chip_count - start
@@ -0,0 +1,183 @@
+"""Hand history: one fixed-width binary record per round, appended to a file.
+
+    python blackjack_history.py hands.bjh
+
+Records are struct-packed little-endian with no padding, after a 16-byte
+header (magic, version, record size). Cards are the engine's 0..51 ints,
+with 255 for an empty slot. Because every record is the same size, the
+reader maps the file straight into a NumPy structured array: columns such
+as records["stake"] are views on the mapping. Nothing is parsed or copied,
+so tens of millions of rounds open instantly. A record torn by a crash
+is ignored, since only whole records are mapped. A hand longer than
+MAX_CARDS or a round with more than MAX_ACTIONS actions is cut to fit,
+and the record's truncated field says so.
+
+Writing uses only the standard library; NumPy is needed to read.
+"""
+import os
+import struct
+import sys
+import time
+
+from blackjack_engine import calculate_hand
+
+MAGIC = b"BJHIST\0\0"
+VERSION = 2
+HEADER = struct.Struct("<8sII")
+MAX_CARDS = 12  # covers almost every hand, but a multi-deck shoe allows 21 aces and a card more
+MAX_ACTIONS = 12
+MAX_AI_SEATS = 6
+NO_CARD = 255
+NO_ANSWER = -32768  # count_answer when the count check was skipped
+
+ACTIONS = ("hit", "stand", "double", "insurance", "no_insurance", "split", "surrender")  # append only
+ACTION_CODES = {a: i + 1 for i, a in enumerate(ACTIONS)}  # 0 pads the actions field
+
+# (name, struct code, NumPy type); Ns fields are N bytes of cards or actions
+FIELDS = [
+    ("time_ms", "q", "<i8"),
+    ("chips", "q", "<i8"),  # balance after the round
+    ("stake", "i", "<i4"),  # main bet, doubled if the player doubled
+    ("insurance", "i", "<i4"),
+    ("payout", "i", "<i4"),  # everything paid back; net = payout - stake - insurance
+    ("running_count", "h", "<i2"),  # the shoe's count before the first card of the round
+    ("count_answer", "h", "<i2"),  # the player's answer to the count check
+    ("count_expected", "h", "<i2"),  # the running count when they answered
+    ("cards_left", "H", "<u2"),  # in the shoe before the deal
+    ("player_total", "B", "u1"),
+    ("dealer_total", "B", "u1"),
+    ("num_ai", "B", "u1"),
+    ("truncated", "B", "u1"),  # 1 if a hand or the actions were cut to fit
+    ("actions", f"{MAX_ACTIONS}s", ("u1", MAX_ACTIONS)),
+    ("player", f"{MAX_CARDS}s", ("u1", MAX_CARDS)),
+    ("dealer", f"{MAX_CARDS}s", ("u1", MAX_CARDS)),
+    ("ai", f"{MAX_CARDS * MAX_AI_SEATS}s", ("u1", (MAX_AI_SEATS, MAX_CARDS))),
+]
+RECORD = struct.Struct("<" + "".join(code for _, code, _ in FIELDS))
+
+
+def _cards(hand, n=MAX_CARDS):
+    return bytes(hand[:n]).ljust(n, bytes([NO_CARD]))
+
+
+class HandHistory:
+    """Appends rounds to path.
+
+    end_round() takes the round as it stands when it is settled. The record
+    is held back until count_answer() or the next end_round()/flush(),
+    since the count check comes after the payout. A history in an older
+    format is moved aside to path.v<version> and a new one started.
+    """
+    def __init__(self, path="hands.bjh"):
+        self.path = path
+        self.pending = None
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not new:
+            with open(path, "rb") as f:
+                header = f.read(HEADER.size)
+            if len(header) == HEADER.size and header[:len(MAGIC)] == MAGIC and HEADER.unpack(header)[1] < VERSION:
+                os.replace(path, f"{path}.v{HEADER.unpack(header)[1]}")
+                new = True
+            else:
+                _check_header(header, path)
+        self._file = open(path, "ab")
+        if new:
+            self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        else:
+            # Drop a record torn by a crash so new ones stay aligned
+            size = os.path.getsize(path)
+            whole = HEADER.size + (size - HEADER.size) // RECORD.size * RECORD.size
+            if whole != size:
+                self._file.truncate(whole)
+
+    def end_round(self, table):
+        self.flush()
+        r = table.round
+        if len(r.ai_hands) > MAX_AI_SEATS:
+            raise ValueError(f"hand history holds at most {MAX_AI_SEATS} AI seats")
+        ai = b"".join(_cards(h) for h in r.ai_hands).ljust(MAX_CARDS * MAX_AI_SEATS, bytes([NO_CARD]))
+        truncated = (len(r.actions) > MAX_ACTIONS
+                     or any(len(h) > MAX_CARDS for h in [r.player_hand, r.dealer_hand] + r.ai_hands))
+        self.pending = [
+            time.time_ns() // 1_000_000, table.chip_count, r.stake, r.insurance_bet, r.payout,
+            r.count_at_deal, NO_ANSWER, 0, r.cards_left_at_deal,
+            calculate_hand(r.player_hand), calculate_hand(r.dealer_hand), len(r.ai_hands), truncated,
+            bytes(ACTION_CODES[a] for a in r.actions[:MAX_ACTIONS]),
+            _cards(r.player_hand), _cards(r.dealer_hand), ai,
+        ]
+
+    def count_answer(self, answer, expected):
+        if self.pending is not None:
+            self.pending[6] = max(-32767, min(32767, answer))
+            self.pending[7] = expected
+            self.flush()
+
+    def flush(self):
+        if self.pending is not None:
+            self._file.write(RECORD.pack(*self.pending))
+            self._file.flush()
+            self.pending = None
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def _check_header(data, path):
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is not a hand history")
+    magic, version, size = HEADER.unpack(data)
+    if magic != MAGIC or version != VERSION or size != RECORD.size:
+        raise ValueError(f"{path} is not a version {VERSION} hand history")
+
+
+def record_dtype():
+    import numpy as np
+    return np.dtype([(name, t) if isinstance(t, str) else (name,) + t for name, _, t in FIELDS])
+
+
+def read_history(path):
+    """The file's records as a read-only NumPy structured array on an mmap."""
+    import numpy as np
+    with open(path, "rb") as f:
+        _check_header(f.read(HEADER.size), path)
+    n = (os.path.getsize(path) - HEADER.size) // RECORD.size
+    if n == 0:
+        return np.zeros(0, dtype=record_dtype())
+    return np.memmap(path, dtype=record_dtype(), mode="r", offset=HEADER.size, shape=(n,))
+
+
+def true_counts(records):
+    return records["running_count"] / (records["cards_left"] / 52).clip(1)
+
+
+def summary(records):
+    import numpy as np
+    net = records["payout"].astype(np.int64) - records["stake"] - records["insurance"]
+    wagered = records["stake"].astype(np.int64).sum()
+    answered = records["count_answer"] != NO_ANSWER
+    actions = records["actions"]
+    return {
+        "rounds": len(records),
+        "net": int(net.sum()),
+        "return_per_wagered": float(net.sum() / wagered) if wagered else 0.0,
+        "win_rate": float((net > 0).mean()) if len(records) else 0.0,
+        "count_checks": int(answered.sum()),
+        "count_check_accuracy": float((records["count_answer"] == records["count_expected"])[answered].mean())
+        if answered.any() else 0.0,
+        "actions": {a: int((actions == code).sum()) for a, code in ACTION_CODES.items()},
+        "truncated": int(records["truncated"].sum()),
+    }
+
+
+def main(argv=None):
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) != 1:
+        print("usage: python blackjack_history.py HISTORY_FILE", file=sys.stderr)
+        sys.exit(2)
+    for key, value in summary(read_history(args[0])).items():
+        print(f"{key:22} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Exact dealer outcome odds for the cards left in the shoe, and move EVs.
+
+Compositions are tuples of 10 counts for card points 2..10 and ace (all
+tens share one slot). Dealer odds are computed exactly by drawing without
+replacement from the composition, dealer standing on 17 or hitting a soft
+17 as Table.play_dealer does under the rules. Results are memoised with a bounded LRU cache, and the
+same set of removed cards reached in any order shares one entry, so a
+repeated state is answered from the cache in microseconds.
+"""
+from functools import lru_cache
+
+from blackjack_engine import CARD_VALUE, card_values, ranks
+
+POINTS = (2, 3, 4, 5, 6, 7, 8, 9, 10, 11)
+OUTCOMES = (17, 18, 19, 20, 21, "bust")
+DEALER_CACHE_SIZE = 1 << 18
+EV_CACHE_SIZE = 1 << 14
+
+_slot = [card_values[r] - 2 for r in ranks]  # rank index -> composition slot
+
+
+def shoe_composition(count, unseen=()):
+    """Composition from a CountTracker, adding back cards the player can't see."""
+    comp = [0] * 10
+    for i, n in enumerate(count.remaining):
+        comp[_slot[i]] += n
+    for card in unseen:
+        comp[CARD_VALUE[card] - 2] += 1
+    return tuple(comp)
+
+
+def card_slot(card):
+    return CARD_VALUE[card] - 2
+
+
+def add_card(total, soft, slot):
+    """(total, soft) after drawing a card of this slot; soft means an ace still counts 11."""
+    t = total + POINTS[slot]
+    aces = soft + (slot == 9)
+    while t > 21 and aces:
+        t -= 10
+        aces -= 1
+    return t, aces > 0
+
+
+@lru_cache(maxsize=DEALER_CACHE_SIZE)
+def _dealer(comp, total, soft, no_ten=False, hit_soft_17=False):
+    # no_ten leaves tens out of the next card only
+    if total > 17 or (total == 17 and not (hit_soft_17 and soft)):
+        return (0.0,) * 5 + (1.0,) if total > 21 else tuple(float(total == t) for t in OUTCOMES[:5]) + (0.0,)
+    n = sum(comp) - (comp[8] if no_ten else 0)
+    out = [0.0] * 6
+    for i, k in enumerate(comp):
+        if k <= 0 or (no_ten and i == 8):
+            continue
+        t, s = add_card(total, soft, i)
+        rest = comp[:i] + (max(k - 1, 0),) + comp[i + 1:]  # fractional compositions stop at zero
+        p = k / n
+        for j, q in enumerate(_dealer(rest, t, s, False, hit_soft_17)):
+            out[j] += p * q
+    return tuple(out)
+
+
+def dealer_odds(upcard_slot, comp, hit_soft_17=False):
+    """Probabilities of the dealer finishing on 17, 18, 19, 20, 21 or bust.
+
+    The hole card is drawn from comp, so it must not already be removed.
+    Against an ace it cannot be a ten: a dealer blackjack ends the round in
+    the insurance phase, before the player plays. A ten upcard has no peek,
+    so its hole card may still be an ace.
+    """
+    ace = upcard_slot == 9
+    return _dealer(comp, POINTS[upcard_slot], ace, ace, hit_soft_17)
+
+
+def _stand(total, odds):
+    if total > 21:
+        return -1.0
+    win = odds[5] + sum(p for t, p in zip(OUTCOMES[:5], odds) if total > t)
+    lose = sum(p for t, p in zip(OUTCOMES[:5], odds) if total < t)
+    return win - lose
+
+
+@lru_cache(maxsize=EV_CACHE_SIZE)
+def hand_evs(total, soft, upcard_slot, comp, hit_soft_17=False):
+    """move_evs for a hand given as its total and soft flag."""
+    odds = dealer_odds(upcard_slot, comp, hit_soft_17)
+    n = sum(comp)
+    probs = [k / n for k in comp]
+
+    @lru_cache(maxsize=None)
+    def best(t, s):
+        # Best of standing and hitting on; busts lose the bet
+        if t > 21:
+            return -1.0
+        return max(_stand(t, odds), hit(t, s))
+
+    @lru_cache(maxsize=None)
+    def hit(t, s):
+        return sum(p * best(*add_card(t, s, i)) for i, p in enumerate(probs) if p > 0)
+
+    stand = _stand(total, odds)
+    double = 2 * sum(p * _stand(add_card(total, soft, i)[0], odds) for i, p in enumerate(probs) if p > 0)
+    return {"hit": hit(total, soft), "stand": stand, "double": double}
+
+
+def move_evs(hand, upcard, comp, hit_soft_17=False):
+    """Expected result in bets of hitting, standing or doubling now.
+
+    Dealer odds are exact for comp (which should include the hole card),
+    with the dealer hitting soft 17 if hit_soft_17.
+    The player's own later draws are taken from comp without removal, which
+    keeps a query to a few dozen states.
+    """
+    total, soft = 0, False
+    for card in hand:
+        total, soft = add_card(total, soft, card_slot(card))
+    return hand_evs(total, soft, card_slot(upcard), comp, hit_soft_17)
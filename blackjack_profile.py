@@ -0,0 +1,127 @@
+"""Frame profiler for the main loop: a HUD summary and Chrome trace export.
+
+The loop calls begin_frame(), then lap(name) as each stage finishes, then
+end_frame() with the frame's counters. The renderer reports every element
+it draws through draw_call(). When neither the HUD nor a recording is on,
+all of these return straight away.
+
+Recordings use the Chrome trace event format. Open them in
+chrome://tracing or https://ui.perfetto.dev. Each frame is a slice named
+after the game phase, with the stages and element draws nested inside.
+"""
+import json
+import time
+from collections import deque
+
+MAX_TRACE_EVENTS = 2_000_000  # about 200 MB of JSON, then the trace is saved
+
+
+class FrameProfiler:
+    def __init__(self, budget_ms=1000 / 30, history=60):
+        self.budget_ms = budget_ms  # a frame over this (excluding the wait) is a drop
+        self.show = False
+        self.frames = deque(maxlen=history)  # (total_ms, {stage: ms}, counters, slowest draw)
+        self.trace = None
+        self.trace_path = None
+        self.active = False
+        self._start = self._lap = 0.0
+        self._stages = {}
+        self._draws = []
+        self._epoch = time.perf_counter()
+
+    def _update_active(self):
+        self.active = self.show or self.trace is not None
+
+    def toggle_hud(self):
+        self.show = not self.show
+        self._update_active()
+
+    # Recording
+    def start_recording(self, path=None):
+        self.trace = []
+        self.trace_path = path or time.strftime("trace-%Y%m%d-%H%M%S.json")
+        self._update_active()
+
+    def stop_recording(self):
+        """Write the recorded trace and return its path (None if not recording)."""
+        if self.trace is None:
+            return None
+        path, events = self.trace_path, self.trace
+        self.trace = self.trace_path = None
+        self._update_active()
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return path
+
+    # Measuring
+    def begin_frame(self):
+        if not self.active:
+            return
+        self._start = self._lap = time.perf_counter()
+        self._stages = {}
+        self._draws = []
+
+    def lap(self, name):
+        """Close the current stage of the frame and name it."""
+        if not self.active:
+            return
+        now = time.perf_counter()
+        self._stages[name] = (self._lap, now)
+        self._lap = now
+
+    def draw_call(self, name, start, end):
+        if self.active:
+            self._draws.append((name, start, end))
+
+    def end_frame(self, phase, **counters):
+        if not self.active or not self._stages:
+            return
+        end = self._lap
+        stages = {k: (b - a) * 1000 for k, (a, b) in self._stages.items()}
+        work = sum(ms for k, ms in stages.items() if k != "wait")
+        slowest = max(self._draws, key=lambda d: d[2] - d[1], default=None)
+        if slowest:
+            slowest = (slowest[0], (slowest[2] - slowest[1]) * 1000)
+        self.frames.append((work, stages, counters, slowest))
+
+        if self.trace is not None:
+            args = dict(counters, work_ms=round(work, 3), dropped=work > self.budget_ms)
+            self._event(f"frame ({phase})", self._start, end, args)
+            for k, (a, b) in self._stages.items():
+                self._event(k, a, b)
+            for name, a, b in self._draws:
+                self._event(name, a, b, cat="draw")
+            if len(self.trace) > MAX_TRACE_EVENTS:
+                self.stop_recording()
+
+    def _event(self, name, start, end, args=None, cat="frame"):
+        ev = {"name": name, "cat": cat, "ph": "X", "pid": 0, "tid": 0,
+              "ts": (start - self._epoch) * 1e6, "dur": (end - start) * 1e6}
+        if args:
+            ev["args"] = args
+        self.trace.append(ev)
+
+    # HUD
+    def summary(self, fps):
+        """Text lines averaging the recent frames, for the overlay."""
+        if not self.frames:
+            return []
+        n = len(self.frames)
+        work = [f[0] for f in self.frames]
+        stages = {}
+        for _, s, _, _ in self.frames:
+            for k, ms in s.items():
+                stages[k] = stages.get(k, 0.0) + ms
+        counters = self.frames[-1][2]
+        slowest = max((f[3] for f in self.frames if f[3]), key=lambda d: d[1], default=None)
+        drops = sum(ms > self.budget_ms for ms in work)
+        lines = [
+            f"FPS {fps:.1f} | frame {sum(work) / n:.2f} ms (max {max(work):.2f}) | drops {drops}/{n}",
+            " | ".join(f"{k} {ms / n:.2f}" for k, ms in stages.items()) + " ms",
+            " | ".join(f"{k} {v}" for k, v in counters.items()),
+        ]
+        if slowest:
+            lines.append(f"slowest draw: {slowest[0]} {slowest[1]:.2f} ms")
+        if self.trace is not None:
+            lines.append(f"recording {self.trace_path} ({len(self.trace)} events)")
+        return lines
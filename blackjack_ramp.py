@@ -0,0 +1,158 @@
+"""Bet ramps: win rate, standard deviation, N0 and risk of ruin of a bet spread.
+
+    python blackjack_ramp.py --ramp 1,1,2,4,6,8,8
+    python blackjack_ramp.py --target-ror 0.05
+
+A ramp is the bet in units for each Hi-Lo true count bucket, from TC <= 0
+up to TC >= +TOP_TC, with the true count floored as the engine counts it.
+A unit is the smallest chip, and the bankroll defaults to the saved chip
+balance.
+
+The cost is all in one vectorized simulation. It deals many shoes side by
+side as ShoeBatch rows, round after round down to the cut card, and
+tallies three things per bucket: how often the bucket comes up, and the
+mean and mean square of a one-unit bet's result. A ramp's moments are
+weighted sums of that table, so thousands of ramps are scored with one
+matrix product. Risk of ruin uses the diffusion approximation
+exp(-2 * ev * bankroll / variance). The player plays the blackjack_strategy
+tables with count deviations, doubling but never splitting, and never
+takes insurance, which only returns even money here.
+"""
+import argparse
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from blackjack_engine import CHIP_VALUES, COUNT_SYSTEMS, NUM_AI_PLAYERS, NUM_DECKS, RESHUFFLE_AT, Rules
+from blackjack_store import ChipStore
+from blackjack_strategy import Strategy
+from blackjack_vector import DECK_COUNTS, ShoeBatch, play_chunk
+
+TOP_TC = 6
+BUCKETS = TOP_TC + 1  # TC <= 0, +1, ..., >= +TOP_TC
+LEVELS = (1, 2, 3, 4, 5, 6, 8, 10, 12, 16)  # bet sizes in units the search tries
+ROWS = 1 << 13  # shoes dealt side by side
+
+_tags = COUNT_SYSTEMS["hi-lo"]
+SLOT_TAGS = np.array(_tags[:9] + _tags[12:], dtype=np.int32)  # tag per ShoeBatch slot, 2..10 then ace
+
+
+def count_table(rounds, num_decks=NUM_DECKS, num_ai_players=NUM_AI_PLAYERS, penetration=None, rng=None, rows=ROWS,
+                strategy=None):
+    """(3, BUCKETS) array: frequency, mean and mean square of a one-unit bet per bucket."""
+    rng = rng if rng is not None else np.random.default_rng()
+    strategy = strategy or Strategy(Rules(num_decks))  # the vectorised dealer stands on soft 17
+    size = 52 * num_decks
+    cut = RESHUFFLE_AT if penetration is None else max(size - int(size * penetration), 1)
+    full = DECK_COUNTS.astype(np.int32) * num_decks
+    shoe = ShoeBatch(rows, num_decks, rng)
+    n, total, sq = np.zeros(BUCKETS), np.zeros(BUCKETS), np.zeros(BUCKETS)
+    for _ in range(-(-rounds // rows)):
+        counts = shoe.counts
+        running = (full - counts) @ SLOT_TAGS
+        tc = np.floor(running / np.maximum(shoe.cards_left() / 52, 1))
+        bucket = np.clip(tc, 0, TOP_TC).astype(np.intp)
+        net = play_chunk(shoe, num_ai_players, False, strategy, tc)
+        n += np.bincount(bucket, minlength=BUCKETS)
+        total += np.bincount(bucket, net, BUCKETS)
+        sq += np.bincount(bucket, net * net, BUCKETS)
+        shoe.refill(shoe.cards_left() < cut)
+    seen = np.maximum(n, 1)
+    return np.array([n / n.sum(), total / seen, sq / seen])
+
+
+def evaluate(table, ramps, bankroll):
+    """Per-round ev and sd, N0 and risk of ruin for each row of ramps, all in units."""
+    freq, mean, sq = table
+    ramps = np.atleast_2d(np.asarray(ramps, dtype=float))
+    ev = ramps @ (freq * mean)
+    var = (ramps ** 2) @ (freq * sq) - ev ** 2
+    winning = ev > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n0 = np.where(winning, var / ev ** 2, np.inf)
+        ror = np.where(winning, np.exp(-2 * ev * bankroll / var), 1.0)
+    return {"ev": ev, "sd": np.sqrt(var), "n0": n0, "ror": ror}
+
+
+def candidate_ramps(levels=LEVELS, max_spread=None):
+    """Every ramp that never lowers the bet as the count rises, as an (R, BUCKETS) array."""
+    ramps = np.array(list(itertools.combinations_with_replacement(levels, BUCKETS)), dtype=float)
+    if max_spread:
+        ramps = ramps[ramps[:, -1] <= ramps[:, 0] * max_spread]
+    return ramps
+
+
+def optimal_ramp(table, bankroll, target_ror, ramps=None):
+    """The ramp with the highest ev whose risk of ruin is within target_ror.
+
+    Returns (ramp, its evaluate() figures), or None if no ramp qualifies.
+    """
+    ramps = candidate_ramps() if ramps is None else np.asarray(ramps, dtype=float)
+    scores = evaluate(table, ramps, bankroll)
+    ok = scores["ror"] <= target_ror
+    if not ok.any():
+        return None
+    best = int(np.argmax(np.where(ok, scores["ev"], -np.inf)))
+    return ramps[best], {k: float(v[best]) for k, v in scores.items()}
+
+
+def _bucket_name(i):
+    return "<=0" if i == 0 else f"{'>=' if i == TOP_TC else ''}+{i}"
+
+
+def _print_ramp(ramp, scores, unit):
+    print("  TC    " + " ".join(f"{_bucket_name(i):>6}" for i in range(BUCKETS)))
+    print("  units " + " ".join(f"{b:6g}" for b in ramp))
+    print(f"  ev {scores['ev'] * unit:+.2f} chips/round ({scores['ev'] * 100:+.2f} units/100)  "
+          f"sd {scores['sd'] * unit:.1f} chips  N0 {scores['n0']:,.0f} rounds  risk of ruin {scores['ror']:.2%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score blackjack bet ramps against the Hi-Lo true count.")
+    parser.add_argument("--ramp", help=f"comma-separated units for the {BUCKETS} buckets, TC <= 0 to >= +{TOP_TC}")
+    parser.add_argument("--target-ror", type=float, default=0.05, help="risk of ruin the optimal ramp may not exceed")
+    parser.add_argument("--bankroll", type=int, help="chips (default: the saved balance)")
+    parser.add_argument("--chips-file", default="chips.json")
+    parser.add_argument("--max-spread", type=float, help="largest bet over the smallest allowed in the search")
+    parser.add_argument("--rounds", type=int, default=4_000_000, help="simulated rounds for the count table")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--decks", type=int, default=NUM_DECKS)
+    parser.add_argument("--ai-players", type=int, default=NUM_AI_PLAYERS)
+    parser.add_argument("--penetration", type=float, help="fraction of the shoe dealt before the cut card")
+    args = parser.parse_args(argv)
+
+    unit = min(CHIP_VALUES.values())
+    chips = args.bankroll if args.bankroll is not None else ChipStore(args.chips_file).saved()[0]
+    bankroll = chips / unit
+
+    start = time.perf_counter()
+    table = count_table(args.rounds, args.decks, args.ai_players, args.penetration, np.random.default_rng(args.seed))
+    print(f"Count table from {args.rounds:,} rounds in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    print(f"Bankroll {chips} chips = {bankroll:g} units of {unit}")
+    print("  TC    " + " ".join(f"{_bucket_name(i):>6}" for i in range(BUCKETS)))
+    print("  freq  " + " ".join(f"{f:6.1%}" for f in table[0]))
+    print("  ev    " + " ".join(f"{m:+6.3f}" for m in table[1]))
+
+    if args.ramp:
+        ramp = [float(b) for b in args.ramp.split(",")]
+        if len(ramp) != BUCKETS:
+            parser.error(f"--ramp needs {BUCKETS} bets")
+        print("Ramp:")
+        _print_ramp(ramp, {k: float(v[0]) for k, v in evaluate(table, ramp, bankroll).items()}, unit)
+
+    start = time.perf_counter()
+    ramps = candidate_ramps(max_spread=args.max_spread)
+    best = optimal_ramp(table, bankroll, args.target_ror, ramps)
+    elapsed = time.perf_counter() - start
+    if best is None:
+        print(f"No ramp of {len(ramps):,} keeps the risk of ruin within {args.target_ror:.2%}; "
+              "the bankroll is too small for the edge at these counts")
+        return
+    print(f"Best of {len(ramps):,} ramps within {args.target_ror:.2%} risk of ruin ({elapsed * 1000:.0f} ms):")
+    _print_ramp(*best, unit)
+
+
+if __name__ == "__main__":
+    main()
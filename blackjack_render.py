@@ -0,0 +1,214 @@
+"""Dirty-rectangle drawing and cached surfaces for the pygame table."""
+import math
+import time
+from collections import OrderedDict
+
+import pygame
+
+
+class SpriteCache:
+    """Derived surfaces (scaled images, shadows, panels) built once and reused.
+
+    Entries are keyed by (source, size, effect) and evicted least recently
+    used first once their pixels pass max_bytes. allocations counts the
+    surfaces built since the last end_frame(); in steady state it is zero.
+    """
+    def __init__(self, max_bytes=32 << 20):
+        self.max_bytes = max_bytes
+        self.surfaces = OrderedDict()
+        self.bytes = 0
+        self.allocations = 0
+        self.frame_allocations = 0
+
+    def get(self, key, build):
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            return surf
+        surf = build()
+        self.allocations += 1
+        self.surfaces[key] = surf
+        self.bytes += _surface_bytes(surf)
+        while self.bytes > self.max_bytes and len(self.surfaces) > 1:
+            _, old = self.surfaces.popitem(last=False)
+            self.bytes -= _surface_bytes(old)
+        return surf
+
+    def scaled(self, image, size):
+        return self.get((image, size, "scale"), lambda: pygame.transform.scale(image, size))
+
+    def shade(self, size, color):
+        """A flat translucent rectangle, e.g. a card shadow or panel backing."""
+        def build():
+            surf = pygame.Surface(size, pygame.SRCALPHA if len(color) == 4 else 0)
+            surf.fill(color)
+            return surf
+        return self.get((None, size, ("shade", color)), build)
+
+    def end_frame(self):
+        self.frame_allocations = self.allocations
+        self.allocations = 0
+        return self.frame_allocations
+
+
+class TextCache:
+    """Rendered text keyed by (font, text, color, antialias), evicted least recently used.
+
+    hits and misses count lookups since the last end_frame(); once the
+    strings on screen settle, a frame is all hits and renders no glyphs.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = self.misses = 0
+        self.frame_hits = self.frame_misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, color, antialias)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surf
+        self.misses += 1
+        surf = self.surfaces[key] = font.render(text, antialias, color)
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surf
+
+    def end_frame(self):
+        self.frame_hits, self.frame_misses = self.hits, self.misses
+        self.hits = self.misses = 0
+        return self.frame_hits, self.frame_misses
+
+
+def _surface_bytes(surf):
+    w, h = surf.get_size()
+    return w * h * surf.get_bytesize()
+
+
+class DirtyRenderer:
+    """Draws a frame as named elements over a cached static layer.
+
+    Each frame the GUI adds elements with a signature (anything comparable
+    that changes when the element would look different) and a screen rect.
+    present() repaints only where an element changed, appeared or went away,
+    and pushes just those rects with display.update.
+
+    blits counts the static-layer blits and element draws of the last
+    present(). A profiler, if set, is told how long each element took, and
+    present() closes its "draw" stage once the canvas is painted, so the
+    caller's next lap times only the scaling and display.update.
+
+    If output (the display) differs from screen, screen is an offscreen
+    canvas at a lower resolution. The changed areas are scaled onto output,
+    snapped to whole blocks of the scale ratio so they match a full-frame
+    scale pixel for pixel.
+    """
+    def __init__(self, screen, profiler=None, output=None):
+        self.screen = screen
+        self.output = output if output is not screen else None
+        if self.output is not None:
+            (cw, ch), (ow, oh) = screen.get_size(), output.get_size()
+            self._block = (cw // math.gcd(cw, ow), ch // math.gcd(ch, oh))
+        self.profiler = profiler
+        self.blits = 0
+        self.static = None
+        self.static_key = None
+        self.elements = []
+        self.prev = {}
+        self.full = True
+
+    def set_static(self, key, build):
+        """Rebuild the static layer with build(surface) when key changes."""
+        if key == self.static_key and self.static is not None:
+            return
+        if self.static is None:
+            self.static = pygame.Surface(self.screen.get_size()).convert()
+        build(self.static)
+        self.static_key = key
+        self.full = True
+
+    def invalidate(self):
+        # Something drew over the screen behind our back (popup, pause)
+        self.full = True
+
+    def add(self, name, sig, rect, draw):
+        self.elements.append((name, sig, pygame.Rect(rect), draw))
+
+    def present(self):
+        current = {name: (sig, tuple(rect)) for name, sig, rect, _ in self.elements}
+        screen = self.screen
+        self.blits = 0
+
+        if self.full:
+            screen.blit(self.static, (0, 0))
+            self.blits += 1
+            for name, _, _, draw in self.elements:
+                self._draw(name, draw)
+            self._lap("draw")
+            if self.output is not None:
+                pygame.transform.scale(screen, self.output.get_size(), self.output)
+            pygame.display.update()
+            dirty = [screen.get_rect()]
+            self.full = False
+        else:
+            dirty = []
+            for name, state in current.items():
+                old = self.prev.get(name)
+                if old != state:
+                    if old:
+                        dirty.append(pygame.Rect(old[1]))
+                    dirty.append(pygame.Rect(state[1]))
+            for name, old in self.prev.items():
+                if name not in current:
+                    dirty.append(pygame.Rect(old[1]))
+
+            for area in dirty:
+                screen.set_clip(area)
+                screen.blit(self.static, area, area)
+                self.blits += 1
+                for name, _, rect, draw in self.elements:
+                    if rect.colliderect(area):
+                        self._draw(name, draw)
+            screen.set_clip(None)
+            self._lap("draw")
+            if dirty:
+                pygame.display.update(self._scale_out(dirty) if self.output is not None else dirty)
+
+        self.prev = current
+        self.elements = []
+        return dirty
+
+    def _scale_out(self, rects):
+        # Scale each canvas rect, grown to whole blocks, onto the same area of the output
+        screen, output = self.screen, self.output
+        (cw, ch), (ow, oh) = screen.get_size(), output.get_size()
+        bx, by = self._block
+        bounds = screen.get_rect()
+        out = []
+        for r in rects:
+            r = r.clip(bounds)
+            if not r:
+                continue
+            x0, y0 = r.x // bx * bx, r.y // by * by
+            x1, y1 = -(-r.right // bx) * bx, -(-r.bottom // by) * by
+            src = pygame.Rect(x0, y0, x1 - x0, y1 - y0)
+            dst = pygame.Rect(x0 * ow // cw, y0 * oh // ch, src.w * ow // cw, src.h * oh // ch)
+            pygame.transform.scale(screen.subsurface(src), dst.size, output.subsurface(dst))
+            out.append(dst)
+        return out
+
+    def _lap(self, name):
+        if self.profiler is not None:
+            self.profiler.lap(name)
+
+    def _draw(self, name, draw):
+        self.blits += 1
+        profiler = self.profiler
+        if profiler is None or not profiler.active:
+            draw(self.screen)
+            return
+        start = time.perf_counter()
+        draw(self.screen)
+        profiler.draw_call(name, start, time.perf_counter())
@@ -0,0 +1,521 @@
+"""Asyncio server hosting many blackjack tables in one process.
+
+    python blackjack_server.py --port 8765
+    python blackjack_server.py --unix /tmp/blackjack.sock
+    python blackjack_server.py --load-test 100,500
+
+Every connection gets its own table: the connecting player's seat plus
+the AI seats. The protocol is one JSON object per line. Requests look
+like {"op": "bet", "amount": 25, "id": 7}. Every change is pushed as a
+{"type": "state"} line that carries everything a client needs to draw the
+table, so a renderer only mirrors the latest state. The reply to a
+request echoes its id.
+
+The round flow is the GUI's (reset_round, handle_insurance, finish_round,
+round_settled, submit_count) on the same engine Table. After a round is
+settled, count_check asks for the running count and count answers it; a
+wrong count costs the bet and ends the game, as in the GUI. Card reveals wait on the event
+loop with asyncio.sleep, so a table that is dealing never holds up
+another one. A request that arrives while cards are still being revealed
+waits for the reveals to finish.
+
+The pygame game plays at a server table when BLACKJACK_SERVER is set:
+
+    BLACKJACK_SERVER=127.0.0.1:8765 python BlackJack1.0.py
+
+It then only draws a RemoteTable, which mirrors the states, and sends the
+clicks as requests.
+"""
+import argparse
+import asyncio
+import json
+import queue
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+
+from blackjack_engine import DECK_SIZE, NUM_AI_PLAYERS, STARTING_CHIPS, Round, Rules, Shoe, Table, calculate_hand, card_name
+from blackjack_strategy import Strategy
+
+CARD_DRAW_INTERVAL = 0.3  # seconds between revealed cards, as in the GUI
+
+
+class CommandError(Exception):
+    pass
+
+
+class TableSession:
+    """One table's round flow, publishing its state through send(dict)."""
+
+    # op -> phases it is allowed in
+    PHASES = {
+        "bet": ("betting",), "clear": ("betting",), "deal": ("betting",), "reshuffle": ("betting",),
+        "insurance": ("insurance",),
+        "hit": ("playing",), "stand": ("playing",), "double": ("playing",),
+        "count_check": ("round_over",), "count": ("count_check",),
+        "new_round": ("round_over", "game_over"),
+        "state": None,
+    }
+
+    def __init__(self, table_id, send, num_ai_players=NUM_AI_PLAYERS, interval=CARD_DRAW_INTERVAL, seed=None):
+        self.id = table_id
+        self.send = send
+        self.interval = interval
+        self.table = Table(shoe=Shoe(seed=seed), chips=STARTING_CHIPS, num_ai_players=num_ai_players,
+                           ai_strategy=Strategy())
+        self.round = self.table.round
+        self.phase = "betting"
+        self.hidden = {}  # hand name -> cards dealt but not yet revealed
+        self._reveals = None
+
+    # State
+    def _shown(self, hand, name):
+        n = self.hidden.get(name, 0)
+        return hand[:len(hand) - n] if n else hand
+
+    def state(self):
+        r = self.round
+        player = self._shown(r.player_hand, "player")
+        dealer = [card_name(c) for c in self._shown(r.dealer_hand, "dealer")]
+        hole_down = dealer and self.phase in ("dealing", "playing", "player_doubling")
+        if hole_down:
+            dealer[0] = None
+        count = self.table.shoe.count
+        return {
+            "type": "state",
+            "table": self.id,
+            "phase": self.phase,
+            "chips": self.table.chip_count,
+            "bet": r.bet,
+            "player": [card_name(c) for c in player],
+            "player_value": calculate_hand(player),
+            "dealer": dealer,
+            "dealer_value": None if hole_down else calculate_hand(self._shown(r.dealer_hand, "dealer")),
+            "ai": [[card_name(c) for c in self._shown(h, f"ai{i}")] for i, h in enumerate(r.ai_hands)],
+            "result": r.result,
+            "cards_left": len(self.table.shoe),
+            "running_count": count.running,
+            "true_count": round(count.true_count(), 2),
+            # The round's wagers and the count it was dealt at, for the client's hand history
+            "stake": r.stake,
+            "payout": r.payout,
+            "insurance_bet": r.insurance_bet,
+            "actions": r.actions,
+            "count_at_deal": r.count_at_deal,
+            "cards_left_at_deal": r.cards_left_at_deal,
+        }
+
+    def publish(self, request_id=None):
+        msg = self.state()
+        if request_id is not None:
+            msg["id"] = request_id
+        self.send(msg)
+
+    # Requests
+    async def handle(self, msg):
+        while self._reveals is not None:
+            await self._reveals
+        op = msg.get("op")
+        request_id = msg.get("id")
+        try:
+            if op not in self.PHASES:
+                raise CommandError(f"unknown op {op!r}")
+            phases = self.PHASES[op]
+            if phases is not None and self.phase not in phases:
+                raise CommandError(f"can't {op} while {self.phase}")
+            if op != "state":
+                getattr(self, op)(**{k: v for k, v in msg.items() if k not in ("op", "id")})
+        except (CommandError, TypeError, ValueError) as e:
+            self.send({"type": "error", "id": request_id, "error": str(e)})
+            return
+        self.publish(request_id)
+
+    def bet(self, amount):
+        amount = int(amount)
+        if amount <= 0:
+            raise CommandError("bets must be positive")
+        if not self.table.add_bet(amount):
+            raise CommandError("Not enough chips for that bet!")
+
+    def clear(self):
+        self.table.clear_bet()
+
+    def reshuffle(self):
+        self.table.shoe.reshuffle()
+
+    def deal(self):
+        # A player blackjack is paid inside the engine
+        phase = self.table.deal()
+        phase = "round_over" if phase == "over" else phase
+        names = ["player", "dealer"] + [f"ai{i}" for i in range(len(self.round.ai_hands))]
+        self.hidden = {name: 2 for name in names}
+        self.phase = "dealing"
+        self._reveal(names * 2, then=lambda: self._set_phase(phase))
+
+    def insurance(self, take):
+        phase = self.table.insurance(bool(take))
+        self.phase = "round_over" if phase == "over" else "playing"
+
+    def hit(self):
+        self.table.hit()
+        self.hidden["player"] = self.hidden.get("player", 0) + 1
+        self._reveal(["player"], then=self._player_card_shown)
+
+    def stand(self):
+        self._finish_round()
+
+    def double(self):
+        if self.table.double() is None:
+            raise CommandError("Not enough chips to double!")
+        self.hidden["player"] = self.hidden.get("player", 0) + 1
+        self.phase = "player_doubling"
+        self._reveal(["player"], then=self._player_card_shown)
+
+    def count_check(self):
+        self.phase = "count_check"
+
+    def count(self, count=None):
+        # None is no answer, which counts as wrong
+        running_count = self.table.shoe.count.running
+        if count is not None and int(count) == running_count:
+            self.round.result = "Correct!"
+            self.phase = "round_over"
+        else:
+            self.round.result = f"Incorrect! Count was {running_count}. You lose your bet."
+            self.table.chip_count = max(0, self.table.chip_count - self.round.bet)
+            self.round.bet = 0
+            self.phase = "game_over"
+
+    def new_round(self):
+        if self.table.chip_count <= 0:
+            self.table.chip_count = STARTING_CHIPS
+        self.table.new_round()
+        self.phase = "betting"
+
+    # Round flow
+    def _set_phase(self, phase):
+        self.phase = phase
+
+    def _player_card_shown(self):
+        if self.phase == "player_doubling" or calculate_hand(self.round.player_hand) > 21:
+            self._finish_round()
+
+    def _finish_round(self):
+        # AI seats draw at once, the dealer's cards are revealed in turn
+        drawn = self.table.finish()
+        self.hidden["dealer"] = self.hidden.get("dealer", 0) + len(drawn)
+        self.phase = "dealer_drawing"
+        self._reveal(["dealer"] * len(drawn), then=self._settle)
+
+    def _settle(self):
+        self.table.settle()
+        self.phase = "round_over"
+
+    def _reveal(self, names, then):
+        self._reveals = asyncio.get_running_loop().create_task(self._run_reveals(names, then))
+
+    async def _run_reveals(self, names, then):
+        for name in names:
+            await asyncio.sleep(self.interval)
+            self.hidden[name] -= 1
+            self.publish()
+        self._reveals = None
+        then()
+        if self._reveals is None:
+            self.publish()
+
+    def close(self):
+        if self._reveals is not None:
+            self._reveals.cancel()
+
+
+class Server:
+    def __init__(self, num_ai_players=NUM_AI_PLAYERS, interval=CARD_DRAW_INTERVAL, seed=None):
+        self.num_ai_players = num_ai_players
+        self.interval = interval
+        self.seed = seed
+        self.tables = {}
+        self._next_id = 0
+
+    async def handle_client(self, reader, writer):
+        self._next_id += 1
+        table_id = self._next_id
+
+        def send(msg):
+            writer.write(json.dumps(msg, separators=(",", ":")).encode() + b"\n")
+
+        seed = None if self.seed is None else f"{self.seed}:{table_id}"
+        session = self.tables[table_id] = TableSession(table_id, send, self.num_ai_players, self.interval, seed)
+        session.publish()
+        try:
+            while line := await reader.readline():
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    msg = None
+                if not isinstance(msg, dict):
+                    send({"type": "error", "error": "requests are one JSON object per line"})
+                    continue
+                await session.handle(msg)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            session.close()
+            del self.tables[table_id]
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, unix=None):
+        if unix:
+            server = await asyncio.start_unix_server(self.handle_client, unix)
+        else:
+            server = await asyncio.start_server(self.handle_client, host, port)
+        return server
+
+
+class Client:
+    """Minimal client: send requests, keep the latest state."""
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.state = None
+        self._next_id = 0
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765, unix=None):
+        if unix:
+            streams = await asyncio.open_unix_connection(unix)
+        else:
+            streams = await asyncio.open_connection(host, port)
+        client = cls(*streams)
+        await client.receive()
+        return client
+
+    async def receive(self):
+        msg = json.loads(await self.reader.readline())
+        if msg["type"] == "state":
+            self.state = msg
+        return msg
+
+    async def request(self, op, **args):
+        """Send a request and return its reply (a state or an error)."""
+        self._next_id += 1
+        request_id = self._next_id
+        self.writer.write(json.dumps(dict(args, op=op, id=request_id)).encode() + b"\n")
+        await self.writer.drain()
+        while True:
+            msg = await self.receive()
+            if msg.get("id") == request_id:
+                return msg
+
+    async def wait_for(self, *phases):
+        while self.state["phase"] not in phases:
+            await self.receive()
+        return self.state
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+CARDS = {card_name(c): c for c in range(DECK_SIZE)}  # state card names back to engine cards
+
+
+class _RemoteShoe:
+    """The cards left and the count, as the latest state gave them."""
+    def __init__(self, table):
+        self.table = table
+        self.cards_left = 0
+        self.count = _RemoteCount()
+
+    def __len__(self):
+        return self.cards_left
+
+    def reshuffle(self):
+        self.table.send("reshuffle")
+
+
+class _RemoteCount:
+    def __init__(self):
+        self.running = 0
+        self.true = 0.0
+
+    def true_count(self):
+        return self.true
+
+
+class RemoteTable:
+    """A server table mirrored for a synchronous client, such as the pygame GUI.
+
+    It has the parts of an engine Table a renderer reads (chip_count, round,
+    shoe and its count) and fills them in from the server's states. A reader
+    thread queues each line and calls notify(), so the client can sleep
+    until something arrives; poll() applies what has arrived on the
+    caller's thread. send() never waits for the reply.
+    """
+    def __init__(self, address, notify=None):
+        # address is host:port, or a Unix socket path
+        if ":" in address and "/" not in address:
+            host, port = address.rsplit(":", 1)
+            self.sock = socket.create_connection((host, int(port)))
+        else:
+            self.sock = socket.socket(socket.AF_UNIX)
+            self.sock.connect(address)
+        self._file = self.sock.makefile("rb")
+        self.notify = notify
+        self._lines = queue.Queue()
+        self._next_id = 0
+        self.pending = 0  # requests sent and not answered yet
+        self.phase = None
+        self.rounds_settled = 0  # rounds seen reaching round_over, for the client's history
+        first = json.loads(self._file.readline())  # the server publishes the table on connect
+        self.round = Round(len(first["ai"]))
+        self.shoe = _RemoteShoe(self)
+        self.rules = Rules()  # what TableSession's tables play
+        self.ai_strategy = Strategy(self.rules)  # the seat's own autoplay, as on a local table
+        self._apply(first)
+        threading.Thread(target=self._read, name="remote-table", daemon=True).start()
+
+    def _read(self):
+        try:
+            for line in self._file:
+                self._lines.put(json.loads(line))
+                if self.notify:
+                    self.notify()
+        except (OSError, ValueError):
+            pass
+        self._lines.put({"type": "error", "error": "Disconnected from the server"})
+        if self.notify:
+            self.notify()
+
+    def _apply(self, msg):
+        r = self.round
+        r.player_hand[:] = [CARDS[n] for n in msg["player"]]
+        r.dealer_hand[:] = [None if n is None else CARDS[n] for n in msg["dealer"]]
+        for hand, cards in zip(r.ai_hands, msg["ai"]):
+            hand[:] = [CARDS[n] for n in cards]
+        r.bet = msg["bet"]
+        r.result = msg["result"]
+        r.stake, r.payout, r.insurance_bet = msg["stake"], msg["payout"], msg["insurance_bet"]
+        r.actions[:] = msg["actions"]
+        r.count_at_deal, r.cards_left_at_deal = msg["count_at_deal"], msg["cards_left_at_deal"]
+        self.chip_count = msg["chips"]
+        if msg["phase"] == "round_over" and self.phase not in (None, "round_over", "count_check", "game_over"):
+            self.rounds_settled += 1
+        self.phase = msg["phase"]
+        self.shoe.cards_left = msg["cards_left"]
+        self.shoe.count.running = msg["running_count"]
+        self.shoe.count.true = msg["true_count"]
+
+    def poll(self):
+        """Apply the states that have arrived. Returns the errors among them."""
+        errors = []
+        while True:
+            try:
+                msg = self._lines.get_nowait()
+            except queue.Empty:
+                return errors
+            if msg.get("id") is not None:
+                self.pending -= 1
+            if msg["type"] == "state":
+                self._apply(msg)
+            else:
+                errors.append(msg["error"])
+
+    def send(self, op, **args):
+        self._next_id += 1
+        self.pending += 1
+        try:
+            self.sock.sendall(json.dumps(dict(args, op=op, id=self._next_id)).encode() + b"\n")
+        except OSError:
+            self.pending -= 1  # the reader reports the lost connection
+
+    def close(self):
+        self.sock.close()
+
+
+# Load test
+async def _play(client, rounds, latencies, think):
+    async def timed(op, **args):
+        await asyncio.sleep(think * (0.5 + random.random()))  # players don't act in lockstep
+        start = time.perf_counter()
+        msg = await client.request(op, **args)
+        latencies.append(time.perf_counter() - start)
+        return msg
+
+    for _ in range(rounds):
+        await timed("bet", amount=min(25, client.state["chips"]))
+        await timed("deal")
+        state = await client.wait_for("insurance", "playing", "round_over")
+        if state["phase"] == "insurance":
+            state = await timed("insurance", take=False)
+        if state["phase"] == "playing":
+            await timed("stand")
+            await client.wait_for("round_over")
+        await timed("new_round")
+
+
+async def load_test(tables, rounds, interval, think=0.25):
+    """Clients acting every think seconds, like players clicking, on tables sharing one loop."""
+    server = Server(interval=interval, seed=0)
+    listener = await server.serve(port=0)
+    port = listener.sockets[0].getsockname()[1]
+    clients = [await Client.connect(port=port) for _ in range(tables)]
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_play(c, rounds, latencies, think) for c in clients))
+    elapsed = time.perf_counter() - start
+    for c in clients:
+        await c.close()
+    listener.close()
+    await listener.wait_closed()
+    latencies.sort()
+    return {
+        "tables": tables,
+        "rounds_per_s": tables * rounds / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def _serve_forever(args):
+    server = Server(args.ai_players, args.interval, args.seed)
+    listener = await server.serve(args.host, args.port, args.unix)
+    print(f"Serving blackjack tables on {args.unix or f'{args.host}:{args.port}'}", file=sys.stderr)
+    async with listener:
+        await listener.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host blackjack tables over a local socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--ai-players", type=int, default=NUM_AI_PLAYERS)
+    parser.add_argument("--interval", type=float, help="seconds between revealed cards "
+                        f"(default {CARD_DRAW_INTERVAL}, or 0 in the load test)")
+    parser.add_argument("--seed", help="seed every table's shoes (each table gets its own stream)")
+    parser.add_argument("--load-test", help="comma-separated table counts to measure request latency with")
+    parser.add_argument("--rounds", type=int, default=20, help="rounds per table in the load test")
+    parser.add_argument("--think", type=float, default=0.25, help="seconds a load test player waits before each action")
+    args = parser.parse_args(argv)
+
+    if args.load_test:
+        for n in map(int, args.load_test.split(",")):
+            r = asyncio.run(load_test(n, args.rounds, args.interval or 0, args.think))
+            print(f"{r['tables']:5} tables: {r['rounds_per_s']:8.0f} rounds/s  "
+                  f"latency p50 {r['p50_ms']:.2f} ms  p99 {r['p99_ms']:.2f} ms")
+        return
+    if args.interval is None:
+        args.interval = CARD_DRAW_INTERVAL
+    try:
+        asyncio.run(_serve_forever(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Command-line Monte Carlo runner for the engine rules, spread over all cores.
+
+    python blackjack_sim.py --hands 100000000 --seed 7 --out run.json
+
+The hands are cut into fixed-size jobs. Job i always plays from its own
+random stream, derived from (seed, i), however many workers run it and in
+whatever order they finish. Every statistic is an integer sum (bets are 10
+units so 3:2 and 6:5 blackjacks and a surrender stay whole), so merging is
+exact and a seed reproduces a run bit for bit on any number of cores.
+
+The player hits below 17, or plays the strategy tables (basic, or with
+count deviations) with whatever splits, doubles and surrenders the rules
+allow. simulate() takes an engine Rules; the command line covers decks
+and penetration, and blackjack_sweep.py runs grids of rule variants.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from blackjack_engine import DECK_SIZE, NUM_AI_PLAYERS, NUM_DECKS, Rules, Shoe, Table
+from blackjack_strategy import Strategy, load_tables, surrenders
+
+BET = 10  # smallest bet that keeps every payout an integer
+PLAYS = ("hit17", "basic", "deviations")  # how the player's seat plays
+MAX_TC = 10  # true counts beyond +/-10 share the end buckets
+JOB_HANDS = 250_000
+
+
+def job_rng(seed, job):
+    digest = hashlib.sha256(f"blackjack-sim:{seed}:{job}".encode()).digest()
+    return random.Random(int.from_bytes(digest, "big"))
+
+
+class Stats:
+    """Count, sum and sum of squares of the net result, overall and per true count."""
+    def __init__(self):
+        self.n = self.total = self.sq = 0
+        self.buckets = {}  # true count -> [n, total, sq]
+
+    def add(self, net, tc):
+        self.n += 1
+        self.total += net
+        self.sq += net * net
+        b = self.buckets.get(tc)
+        if b is None:
+            b = self.buckets[tc] = [0, 0, 0]
+        b[0] += 1
+        b[1] += net
+        b[2] += net * net
+
+    def merge(self, other):
+        self.n += other.n
+        self.total += other.total
+        self.sq += other.sq
+        for tc, (n, total, sq) in other.buckets.items():
+            b = self.buckets.setdefault(tc, [0, 0, 0])
+            b[0] += n
+            b[1] += total
+            b[2] += sq
+
+    @staticmethod
+    def summary(n, total, sq):
+        # Per unit bet
+        if not n:
+            return {"hands": 0, "ev": 0.0, "sd": 0.0, "se": 0.0}
+        mean = total / n / BET
+        var = max(sq / n / BET ** 2 - mean * mean, 0.0)
+        return {"hands": n, "ev": mean, "sd": math.sqrt(var), "se": math.sqrt(var / n)}
+
+    def report(self):
+        return {
+            "overall": self.summary(self.n, self.total, self.sq),
+            "true_count": {tc: self.summary(*self.buckets[tc]) for tc in sorted(self.buckets)},
+        }
+
+
+def player_strategy(table, play):
+    """A play_round strategy for the player's seat, or None to hit below 17."""
+    if play == "hit17":
+        return None
+    strategy = Strategy(table.rules, deviations=play == "deviations")
+    count = table.shoe.count
+    r = table.round
+
+    def decide(hand, upcard):
+        split = hand is r.split_hand
+        action = strategy.action(hand, upcard, count.true_count(), table.can_double(split), table.can_split())
+        if action != "split" and table.can_surrender() and surrenders(hand, upcard):
+            return "surrender"
+        return action
+    return decide
+
+
+def run_job(args):
+    seed, job, hands, rules, ai_players, count_system, ai_play, play = args
+    rng = job_rng(seed, job)
+    shoe = Shoe(rules.decks, rng=rng, count_system=count_system, penetration=rules.penetration)
+    strategy = Strategy(rules) if ai_play == "strategy" else None
+    table = Table(shoe=shoe, chips=1 << 62, num_ai_players=ai_players, ai_strategy=strategy, rules=rules)
+    player = player_strategy(table, play)
+    r = table.round
+    stats = Stats()
+    play_round = table.play_round
+    for _ in range(hands):
+        net = play_round(BET, player)
+        # The count the hand was dealt at, after any reshuffle at the cut card
+        decks = max(r.cards_left_at_deal / DECK_SIZE, 1)
+        tc = max(-MAX_TC, min(MAX_TC, math.floor(r.count_at_deal / decks)))
+        stats.add(net, tc)
+    return stats
+
+
+def simulate(hands, seed=0, workers=None, decks=NUM_DECKS, ai_players=NUM_AI_PLAYERS,
+             count_system="hi-lo", job_hands=JOB_HANDS, progress=None, penetration=None, ai_play="strategy",
+             rules=None, play="hit17"):
+    """Play hands and return the merged Stats. rules, if given, overrides decks and penetration."""
+    rules = rules or Rules(decks, penetration)
+    jobs = [(seed, i, min(job_hands, hands - i * job_hands), rules, ai_players, count_system, ai_play, play)
+            for i in range(math.ceil(hands / job_hands))]
+    if ai_play == "strategy" or play != "hit17":
+        load_tables(rules)  # build and cache the tables once, before the workers read them
+    total = Stats()
+
+    def merge(results):
+        for i, stats in enumerate(results):
+            total.merge(stats)
+            if progress:
+                progress(i + 1, len(jobs))
+
+    if workers == 1:
+        merge(map(run_job, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            merge(pool.map(run_job, jobs))
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate blackjack hands with the game's rules.")
+    parser.add_argument("--hands", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--decks", type=int, default=NUM_DECKS)
+    parser.add_argument("--ai-players", type=int, default=NUM_AI_PLAYERS)
+    parser.add_argument("--count", default="hi-lo", help="count system used for the true count buckets")
+    parser.add_argument("--penetration", type=float, help="fraction of the shoe dealt before the cut card")
+    parser.add_argument("--ai-play", choices=("strategy", "hit17"), default="strategy",
+                        help="AI seats play the strategy tables with count deviations, or hit below 17")
+    parser.add_argument("--play", choices=PLAYS, default="hit17",
+                        help="the player hits below 17, or plays the strategy tables without or with deviations")
+    parser.add_argument("--job-hands", type=int, default=JOB_HANDS)
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    stats = simulate(args.hands, args.seed, args.workers, args.decks, args.ai_players, args.count,
+                     args.job_hands, progress=lambda done, n: print(f"\r{done}/{n} jobs", end="", file=sys.stderr),
+                     penetration=args.penetration, ai_play=args.ai_play, play=args.play)
+    elapsed = time.perf_counter() - start
+    print(file=sys.stderr)
+
+    report = stats.report()
+    report["config"] = vars(args)
+    report["seconds"] = elapsed
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    o = report["overall"]
+    print(f"{o['hands']} hands in {elapsed:.1f}s ({o['hands'] / elapsed:,.0f}/s)")
+    print(f"EV {o['ev']:+.5f} +/- {o['se']:.5f} per unit, SD {o['sd']:.4f}")
+    for tc, b in report["true_count"].items():
+        print(f"  TC {tc:+3d}: {b['hands']:>12} hands  EV {b['ev']:+.5f} +/- {b['se']:.5f}")
+
+
+if __name__ == "__main__":
+    main()
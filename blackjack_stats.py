@@ -0,0 +1,152 @@
+"""Session statistics kept in constant memory, however long the session runs.
+
+Each settled round is folded into running totals. Welford's method gives
+the mean and variance of the net result without keeping the results, both
+overall and per Hi-Lo true count at the deal, where the per-count figures
+are for the main bet in units of the stake. Count checks are folded in
+the same way. snapshot() flattens everything into one dict, for the
+in-game panel and as a row of the CSV export.
+"""
+import csv
+import math
+import os
+import time
+
+from blackjack_engine import calculate_hand
+from blackjack_history import NO_ANSWER
+
+MAX_TC = 6  # true counts beyond +/-6 share the end buckets
+
+
+class Running:
+    """Count, mean and variance of a stream of numbers (Welford's method)."""
+    __slots__ = ("n", "mean", "m2")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x):
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else 0.0
+
+    @property
+    def sd(self):
+        return math.sqrt(self.variance)
+
+
+class Bucket:
+    """Outcomes at one true count: tallies plus the net result per unit bet."""
+    __slots__ = ("wins", "losses", "pushes", "net")
+
+    def __init__(self):
+        self.wins = self.losses = self.pushes = 0
+        self.net = Running()
+
+    def add(self, net, stake):
+        if net > 0:
+            self.wins += 1
+        elif net < 0:
+            self.losses += 1
+        else:
+            self.pushes += 1
+        if stake:
+            self.net.add(net / stake)
+
+
+class SessionStats:
+    def __init__(self):
+        self.started = time.time()
+        self.net = Running()  # chips per round
+        self.outcomes = dict.fromkeys(("win", "loss", "push", "blackjack"), 0)
+        self.insurance_taken = self.insurance_won = 0
+        self.buckets = [Bucket() for _ in range(2 * MAX_TC + 1)]
+        self.count_checks = self.count_correct = 0
+        self.count_error = Running()  # absolute miss on the count check
+
+    def end_round(self, table):
+        """Fold in the round as it stands once it is settled."""
+        r = table.round
+        net = r.payout - r.stake - r.insurance_bet
+        self.net.add(net)
+        # Outcomes are for the main bet; insurance is tallied on its own
+        insured = 0
+        if r.insurance_bet:
+            won = len(r.dealer_hand) == 2 and calculate_hand(r.dealer_hand) == 21
+            self.insurance_taken += 1
+            self.insurance_won += won
+            insured = r.insurance_bet * (table.rules.insurance_pays - 1) if won else -r.insurance_bet
+        net -= insured
+        natural = len(r.player_hand) == 2 and not r.split_hand and calculate_hand(r.player_hand) == 21
+        if natural and net > 0:
+            self.outcomes["blackjack"] += 1
+        else:
+            self.outcomes["win" if net > 0 else "loss" if net < 0 else "push"] += 1
+        # The true count as the player saw it when the cards came out
+        decks = max(r.cards_left_at_deal / 52, 1)
+        tc = max(-MAX_TC, min(MAX_TC, math.floor(r.count_at_deal / decks)))
+        self.buckets[tc + MAX_TC].add(net, r.stake)
+
+    def count_answer(self, answer, expected):
+        """Same arguments as HandHistory.count_answer."""
+        self.count_checks += 1
+        if answer == NO_ANSWER:
+            return
+        self.count_correct += answer == expected
+        self.count_error.add(abs(answer - expected))
+
+    def snapshot(self):
+        n = self.net.n
+        out = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "minutes": round((time.time() - self.started) / 60, 2),
+            "rounds": n,
+            "net_mean": self.net.mean,
+            "net_sd": self.net.sd,
+            "net_se": self.net.sd / math.sqrt(n) if n else 0.0,
+        }
+        for k, v in self.outcomes.items():
+            out[f"{k}_rate"] = v / n if n else 0.0
+        out["insurance_taken"] = self.insurance_taken
+        out["insurance_won"] = self.insurance_won
+        out["count_checks"] = self.count_checks
+        out["count_accuracy"] = self.count_correct / self.count_checks if self.count_checks else 0.0
+        out["count_mean_error"] = self.count_error.mean
+        for i, b in enumerate(self.buckets):
+            tc = i - MAX_TC
+            played = b.wins + b.losses + b.pushes
+            out[f"tc{tc:+d}_rounds"] = played
+            out[f"tc{tc:+d}_win_rate"] = b.wins / played if played else 0.0
+            out[f"tc{tc:+d}_ev"] = b.net.mean
+        return out
+
+    def summary(self):
+        """A few lines for the in-game panel."""
+        s = self.snapshot()
+        lines = [
+            f"Rounds {s['rounds']} | net {s['net_mean']:+.1f} +/- {s['net_se']:.1f} chips/round (sd {s['net_sd']:.0f})",
+            f"Win {s['win_rate']:.1%}  BJ {s['blackjack_rate']:.1%}  push {s['push_rate']:.1%}  "
+            f"loss {s['loss_rate']:.1%} | insurance {s['insurance_won']}/{s['insurance_taken']}",
+            f"Count checks {s['count_checks']}: {s['count_accuracy']:.0%} right, mean miss {s['count_mean_error']:.1f}",
+        ]
+        played = [(i - MAX_TC, b) for i, b in enumerate(self.buckets) if b.net.n]
+        if played:
+            lines.append("TC  " + "  ".join(f"{tc:+d}: {b.net.mean:+.2f}" for tc, b in played) + "  (per unit)")
+        return lines
+
+    def write_csv(self, path):
+        """Append a snapshot row, writing the header first if the file is new."""
+        row = self.snapshot()
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        with open(path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(row))
+            if new:
+                writer.writeheader()
+            writer.writerow(row)
@@ -0,0 +1,145 @@
+"""Chip balance persistence: in-memory balance, background writes, journal.
+
+Every change is appended to a journal line holding the event, the chip
+delta and the resulting balance, so the latest line is always the exact
+balance and the journal is the record of bets and payouts since the last
+snapshot. A background thread appends the lines in batches, one fsync per
+batch. Every SNAPSHOT_EVERY records, and on close(), it replaces chips.json
+atomically (write a temp file, then rename) and only then empties the
+journal, so the journal stays bounded however long the game runs. Callers
+never touch the disk. On load the journal is replayed past the snapshot,
+which recovers the exact balance after a crash.
+"""
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from blackjack_engine import STARTING_CHIPS
+
+_STOP = object()
+SNAPSHOT_EVERY = 500  # journal records between snapshots
+
+
+class ChipStore:
+    def __init__(self, path="chips.json", journal_path=None, starting=STARTING_CHIPS, delay=0.25):
+        self.path = path
+        self.journal_path = journal_path or os.path.splitext(path)[0] + ".journal"
+        self.starting = starting
+        self.delay = delay  # seconds a burst of clicks is given to coalesce
+        self.chips = starting
+        self.seq = 0
+        self._queue = queue.Queue()
+        self._thread = None
+
+    # Loading (once, before the game starts)
+    def saved(self):
+        """The saved balance and its seq, read without changing the files."""
+        chips, seq = self._read_snapshot()
+        for rec in self._read_journal():
+            if rec["seq"] > seq:
+                chips, seq = rec["chips"], rec["seq"]
+        return (chips if chips > 0 else self.starting), seq
+
+    def load(self):
+        self.chips, self.seq = self.saved()
+
+        # Compact: the snapshot now holds everything, start a fresh journal
+        self._write_snapshot(self.chips, self.seq)
+        self._truncate_journal()
+        return self.chips
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.path):
+            return self.starting, 0
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            return int(data.get("chips", self.starting)), int(data.get("seq", 0))
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            print(f"{self.path} is unreadable ({e}); recovering from the journal", file=sys.stderr)
+            return self.starting, 0
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_path):
+            return []
+        records = []
+        with open(self.journal_path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break  # a torn last line from a crash mid-write
+        return records
+
+    # Recording (called from the game loop, never blocks on I/O)
+    def record(self, event, chips):
+        self.seq += 1
+        rec = {"seq": self.seq, "event": event, "amount": chips - self.chips, "chips": chips}
+        self.chips = chips
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="chip-store", daemon=True)
+            self._thread.start()
+        self._queue.put(rec)
+
+    def close(self):
+        """Write anything pending and stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    # Writer thread
+    def _run(self):
+        journalled, last = 0, None  # records in the journal past the snapshot, and the latest
+        while True:
+            batch = [self._queue.get()]
+            time.sleep(self.delay)
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [r for r in batch if r is not _STOP]
+            stopping = len(records) != len(batch)
+            try:
+                if records:
+                    self._append_journal(records)
+                    journalled += len(records)
+                    last = records[-1]
+                if journalled and (journalled >= SNAPSHOT_EVERY or stopping):
+                    # Only this thread appends, so the snapshot covers every line in the journal
+                    self._write_snapshot(last["chips"], last["seq"])
+                    self._truncate_journal()
+                    journalled = 0
+            except OSError as e:
+                print(f"Could not save chips: {e}", file=sys.stderr)
+            if stopping:
+                return
+
+    def _append_journal(self, records):
+        with open(self.journal_path, "a") as f:
+            f.write("".join(json.dumps(r) + "\n" for r in records))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _truncate_journal(self):
+        with open(self.journal_path, "w") as f:
+            os.fsync(f.fileno())
+
+    def _write_snapshot(self, chips, seq):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"chips": chips, "seq": seq}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        if hasattr(os, "O_DIRECTORY"):
+            # Make the rename durable before the journal lines behind it are dropped
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
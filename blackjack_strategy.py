@@ -0,0 +1,263 @@
+"""Basic strategy and Hi-Lo count deviations as flat lookup tables.
+
+    python blackjack_strategy.py            # chart and index plays for 6 decks
+    python blackjack_strategy.py --decks 2 --h17 --das
+
+Every decision is one index into a bytes table. The index combines the
+floored true count, whether the hand may still double, a row for the hand,
+and the dealer's upcard. The rows are hard totals 0..21, soft totals
+22 + total, and pairs 44 + card points - 2.
+
+The tables are computed from blackjack_odds for an engine Rules: its deck
+count, whether the dealer hits soft 17 and whether a split hand may double.
+The first-two-cards table doubles on any two cards; the table passes
+can_double for narrower rules. Each true count gets its own composition: a
+half-dealt shoe with low cards taken out and tens and aces left in. The
+count deviations are the cells where that table differs from the table at a
+count of zero. Building every table takes a second or two, so they are
+saved under CACHE_FOLDER, keyed on those rules, and only recomputed when the
+inputs change.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+
+from blackjack_engine import CARD_VALUE, NUM_DECKS, Rules, calculate_hand, is_soft
+from blackjack_odds import POINTS, add_card, hand_evs
+
+CACHE_FOLDER = ".asset_cache"
+RULE_FIELDS = ("decks", "hit_soft_17", "double_after_split")  # the Rules the tables depend on
+VERSION = 4  # bump when the way tables are computed changes
+MAX_TC = 8  # true counts beyond +/-8 use the end tables
+ACTIONS = ("hit", "stand", "double", "split")
+HIT, STAND, DOUBLE, SPLIT = range(4)
+SOFT, PAIR = 22, 44  # first soft and pair rows
+ROWS = PAIR + 10
+UPCARDS = 10
+TABLE_SIZE = ROWS * UPCARDS
+# Late surrender: (hard total, upcard points) pairs, the usual chart for four or more decks
+SURRENDER = {(16, 9), (16, 10), (16, 11), (15, 10)}
+
+
+def count_composition(num_decks, true_count):
+    """Card points 2..11 left in a half-dealt shoe at this Hi-Lo true count.
+
+    The running count is true_count times the decks left, at least one as
+    CountTracker divides. Half of it comes from low cards gone (2-6 equally)
+    and half from high cards left (tens and aces in deck proportion), so the
+    shoe size stays the same. No slot goes below zero.
+    """
+    decks = num_decks / 2
+    shift = true_count * max(decks, 1) / 10
+    low, mid = 4 * decks - shift, 4 * decks
+    return tuple(max(k, 0.0) for k in (low,) * 5 + (mid,) * 3 + (16 * decks + 4 * shift, 4 * decks + shift))
+
+
+def _best(evs, first):
+    moves = (HIT, STAND, DOUBLE) if first else (HIT, STAND)
+    return max(moves, key=lambda m: evs[ACTIONS[m]])
+
+
+def _build(rules, true_count):
+    # Tables for one true count: (later cards, first two cards)
+    comp = count_composition(rules.decks, true_count)
+    h17 = rules.hit_soft_17
+    later, first = bytearray(TABLE_SIZE), bytearray(TABLE_SIZE)
+    n = sum(comp)
+    for up in range(UPCARDS):
+        c = comp[:up] + (max(comp[up] - 1, 0.0),) + comp[up + 1:]
+        probs = [k / n for k in c]
+
+        def best_ev(total, soft, may_double=True):
+            if total > 21:
+                return -1.0
+            evs = hand_evs(total, soft, up, c, h17)
+            return max(evs["hit"], evs["stand"], evs["double"] if may_double else -2.0)
+
+        for row in range(PAIR):
+            soft = row >= SOFT
+            total = row - SOFT if soft else row
+            if total >= 21 or (soft and total < 12):
+                later[row * UPCARDS + up] = first[row * UPCARDS + up] = STAND
+                continue
+            evs = hand_evs(total, soft, up, c, h17)
+            later[row * UPCARDS + up] = _best(evs, False)
+            first[row * UPCARDS + up] = _best(evs, True)
+
+        for slot in range(10):
+            total, soft = add_card(*add_card(0, False, slot), slot)
+            row = (SOFT + total if soft else total) * UPCARDS + up
+            later[(PAIR + slot) * UPCARDS + up] = later[row]
+            first[(PAIR + slot) * UPCARDS + up] = first[row]
+            # Each split hand starts from one card; split aces take one card only
+            start = add_card(0, False, slot)
+            if slot == 9:
+                one = sum(p * hand_evs(*add_card(*start, i), up, c, h17)["stand"] for i, p in enumerate(probs) if p > 0)
+            else:
+                one = sum(p * best_ev(*add_card(*start, i), rules.double_after_split)
+                          for i, p in enumerate(probs) if p > 0)
+            if 2 * one > best_ev(total, soft):
+                first[(PAIR + slot) * UPCARDS + up] = SPLIT
+    return bytes(later + first)
+
+
+def _rules_key(rules):
+    fields = rules.as_dict()
+    return json.dumps({k: fields[k] for k in RULE_FIELDS}, sort_keys=True)
+
+
+def _cache_path(rules, cache_dir):
+    key = hashlib.sha1(f"{VERSION}|{_rules_key(rules)}|{MAX_TC}".encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"strategy-{key}.bin")
+
+
+_loaded = {}
+
+
+def load_tables(rules=None, cache_dir=CACHE_FOLDER):
+    """Every true count's tables concatenated for rules (an engine Rules), from the cache when present."""
+    rules = rules or Rules()
+    loaded = _rules_key(rules)
+    if loaded in _loaded:
+        return _loaded[loaded]
+    path = _cache_path(rules, cache_dir)
+    size = (2 * MAX_TC + 1) * 2 * TABLE_SIZE
+    tables = None
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            tables = f.read()
+        if len(tables) != size:
+            tables = None
+    if tables is None:
+        tables = b"".join(_build(rules, tc) for tc in range(-MAX_TC, MAX_TC + 1))
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(tables)
+        os.replace(tmp, path)
+    _loaded[loaded] = tables
+    return tables
+
+
+class Strategy:
+    """Picks hit, stand, double or split for a hand with one table lookup.
+
+    rules is the engine Rules the table plays under (Rules() by default).
+    With deviations off every decision uses the count-zero table, which is
+    plain basic strategy.
+    """
+    def __init__(self, rules=None, deviations=True, cache_dir=CACHE_FOLDER):
+        self.rules = rules = rules or Rules()
+        self.num_decks = rules.decks
+        self.deviations = deviations
+        self.tables = load_tables(rules, cache_dir)
+
+    def index(self, hand, upcard, true_count=0.0, can_double=True, can_split=False):
+        total = aces = 0
+        for card in hand:
+            v = CARD_VALUE[card]
+            total += v
+            aces += v == 11
+        while total > 21 and aces:
+            total -= 10
+            aces -= 1
+        if total > 21:
+            total = 21  # bust hands just stand
+        row = SOFT + total if aces else total
+        two = len(hand) == 2
+        if can_split and two and CARD_VALUE[hand[0]] == CARD_VALUE[hand[1]]:
+            row = PAIR + CARD_VALUE[hand[0]] - 2
+        tc = max(-MAX_TC, min(MAX_TC, math.floor(true_count))) if self.deviations else 0
+        return (((tc + MAX_TC) * 2 + (can_double and two)) * ROWS + row) * UPCARDS + CARD_VALUE[upcard] - 2
+
+    def action(self, hand, upcard, true_count=0.0, can_double=True, can_split=False):
+        return ACTIONS[self.tables[self.index(hand, upcard, true_count, can_double, can_split)]]
+
+    def play_hand(self, hand, upcard, true_count, draw):
+        """Play hand out without splitting, appending cards from draw().
+
+        The total is kept as cards arrive, so each decision is one lookup.
+        """
+        tables = self.tables
+        tc = max(-MAX_TC, min(MAX_TC, math.floor(true_count))) if self.deviations else 0
+        base = (tc + MAX_TC) * 2 * TABLE_SIZE + CARD_VALUE[upcard] - 2
+        first = TABLE_SIZE if len(hand) == 2 else 0  # the first-two-cards table allows doubling
+        total = aces = 0
+        for card in hand:
+            v = CARD_VALUE[card]
+            total += v
+            aces += v == 11
+        while True:
+            while total > 21 and aces:
+                total -= 10
+                aces -= 1
+            if total >= 21:
+                return
+            action = tables[base + first + (SOFT + total if aces else total) * UPCARDS]
+            if action == STAND:
+                return
+            card = draw()
+            hand.append(card)
+            v = CARD_VALUE[card]
+            total += v
+            aces += v == 11
+            if action == DOUBLE:
+                return
+            first = 0
+
+
+def surrenders(hand, upcard):
+    """Whether basic strategy gives up this two-card hand, where surrender is offered."""
+    return (len(hand) == 2 and not is_soft(hand)
+            and (calculate_hand(hand), CARD_VALUE[upcard]) in SURRENDER)
+
+
+def _row_name(row):
+    if row >= PAIR:
+        p = POINTS[row - PAIR]
+        return f"{'A' if p == 11 else p},{'A' if p == 11 else p}"
+    return f"soft {row - SOFT}" if row >= SOFT else f"hard {row}"
+
+
+def deviations(rules=None):
+    """(hand, upcard points, true count, action) where the count changes the two-card play."""
+    tables = load_tables(rules)
+    base = TABLE_SIZE * (2 * MAX_TC + 1)  # count zero, first two cards
+    out = []
+    for row in list(range(5, 21)) + list(range(SOFT + 13, SOFT + 21)) + list(range(PAIR, ROWS)):
+        for up in range(UPCARDS):
+            cell = row * UPCARDS + up
+            zero = tables[base + cell]
+            for direction in (range(1, MAX_TC + 1), range(-1, -MAX_TC - 1, -1)):
+                for tc in direction:
+                    action = tables[((tc + MAX_TC) * 2 + 1) * TABLE_SIZE + cell]
+                    if action != zero:
+                        out.append((_row_name(row), POINTS[up], tc, ACTIONS[action]))
+                        break
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the strategy chart and count deviations.")
+    parser.add_argument("--decks", type=int, default=NUM_DECKS)
+    parser.add_argument("--h17", action="store_true", help="the dealer hits soft 17")
+    parser.add_argument("--das", action="store_true", help="split hands may double")
+    args = parser.parse_args(argv)
+
+    rules = Rules(args.decks, hit_soft_17=args.h17, double_after_split=args.das)
+    tables = load_tables(rules)
+    base = TABLE_SIZE * (2 * MAX_TC + 1)
+    letters = "HSDP"
+    print("          " + " ".join(f"{'A' if p == 11 else p:>2}" for p in POINTS))
+    for row in list(range(5, 21)) + list(range(SOFT + 13, SOFT + 21)) + list(range(PAIR, ROWS)):
+        cells = tables[base + row * UPCARDS:base + (row + 1) * UPCARDS]
+        print(f"{_row_name(row):9} " + " ".join(f"{letters[a]:>2}" for a in cells))
+    print("\nIndex plays (first two cards):")
+    for hand, up, tc, action in deviations(rules):
+        print(f"  {hand:9} vs {'A' if up == 11 else up:>2}: {action} at TC {tc:+d}")
+
+
+if __name__ == "__main__":
+    main()
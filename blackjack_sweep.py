@@ -0,0 +1,150 @@
+"""Rule variants over a grid, each result cached on disk under what it depends on.
+
+    python blackjack_sweep.py --play basic --split yes --dealer s17,h17 --das no,yes --decks 2,6
+    python blackjack_sweep.py --play basic --split yes --dealer s17,h17 --das no,yes --decks 2,6,8
+
+Each dimension takes a comma-separated list, and every combination is one
+blackjack_sim run on the game's rules with those fields changed. A cell's
+result is saved as CACHE_FOLDER/sweep/<key>.json. The key hashes the
+rules, the player and AI strategies, the seed and the hand count, so the
+second command above only simulates the eight-deck cells. Every cell uses
+the same seed, so cells are compared on the same random streams.
+
+Each cell's strategy tables are built for its own rules, so H17 and DAS
+cells play their own basic strategy.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+
+import blackjack_strategy
+from blackjack_engine import NUM_AI_PLAYERS, Rules
+from blackjack_sim import JOB_HANDS, PLAYS, simulate
+from blackjack_strategy import CACHE_FOLDER
+
+VERSION = 3  # bump when the engine or simulation changes what a cell's result would be
+YES_NO = {"yes": True, "no": False}
+
+
+def _penetration(value):
+    return None if value == "default" else float(value)
+
+
+def _payout(value):
+    win, stake = value.split(":")
+    return int(win), int(stake)
+
+
+def _double(value):
+    if value not in ("any", "two", "9-11", "10-11"):
+        raise ValueError(value)
+    return value
+
+
+# Command-line dimension -> (Rules field, parser for one value)
+DIMENSIONS = {
+    "decks": ("decks", int),
+    "penetration": ("penetration", _penetration),
+    "dealer": ("hit_soft_17", {"s17": False, "h17": True}.__getitem__),
+    "double": ("double_on", _double),
+    "split": ("split", YES_NO.__getitem__),
+    "das": ("double_after_split", YES_NO.__getitem__),
+    "surrender": ("surrender", YES_NO.__getitem__),
+    "payout": ("blackjack_pays", _payout),
+}
+
+
+def grid(base, dimensions):
+    """Rules for every combination of {field: [values]}, varying base."""
+    fields = list(dimensions)
+    return [base.replace(**dict(zip(fields, values))) for values in itertools.product(*dimensions.values())]
+
+
+def cell_key(rules, hands, seed, play, ai_play, ai_players, job_hands):
+    spec = {
+        "version": VERSION, "strategy_version": blackjack_strategy.VERSION, "rules": rules.as_dict(),
+        "hands": hands, "seed": seed, "play": play, "ai_play": ai_play, "ai_players": ai_players,
+        "job_hands": job_hands,
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:24]
+
+
+def run_cell(rules, hands, seed=0, play="basic", ai_play="strategy", ai_players=NUM_AI_PLAYERS,
+             job_hands=JOB_HANDS, workers=None, cache_dir=CACHE_FOLDER):
+    """(report, cached) for one set of rules, from the cache when it has been run before."""
+    folder = os.path.join(cache_dir, "sweep")
+    path = os.path.join(folder, cell_key(rules, hands, seed, play, ai_play, ai_players, job_hands) + ".json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f), True
+    start = time.perf_counter()
+    report = simulate(hands, seed, workers, ai_players=ai_players, job_hands=job_hands, ai_play=ai_play,
+                      rules=rules, play=play).report()
+    report["rules"] = rules.as_dict()
+    report["seconds"] = time.perf_counter() - start
+    os.makedirs(folder, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp, path)
+    return report, False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate a grid of blackjack rule variants, with cached cells.")
+    parser.add_argument("--decks", help="deck counts, e.g. 1,2,6,8")
+    parser.add_argument("--penetration", help="fractions dealt before the cut card, or 'default'")
+    parser.add_argument("--dealer", help="s17 and/or h17")
+    parser.add_argument("--double", help="any, two, 9-11 and/or 10-11")
+    parser.add_argument("--split", help="yes and/or no: split a pair once")
+    parser.add_argument("--das", help="yes and/or no: double after splitting")
+    parser.add_argument("--surrender", help="yes and/or no: late surrender")
+    parser.add_argument("--payout", help="blackjack payouts, e.g. 3:2,6:5")
+    parser.add_argument("--hands", type=int, default=1_000_000, help="hands per cell")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--play", choices=PLAYS, default="basic")
+    parser.add_argument("--ai-play", choices=("strategy", "hit17"), default="strategy")
+    parser.add_argument("--ai-players", type=int, default=NUM_AI_PLAYERS)
+    parser.add_argument("--job-hands", type=int, default=JOB_HANDS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--cache-dir", default=CACHE_FOLDER)
+    parser.add_argument("--out", help="write every cell's rules and results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    dimensions, labels = {}, {}
+    for name, (field, parse) in DIMENSIONS.items():
+        values = getattr(args, name)
+        if values is None:
+            continue
+        labels[name] = [v.strip() for v in values.split(",")]
+        try:
+            dimensions[field] = [parse(v) for v in labels[name]]
+        except (KeyError, ValueError):
+            parser.error(f"bad value in --{name} {values}")
+    cells = grid(Rules(), dimensions)
+
+    print("  ".join(f"{n:>11}" for n in labels) + "          EV/unit      +/-        SD")
+    results = []
+    computed = 0
+    start = time.perf_counter()
+    for rules, values in zip(cells, itertools.product(*labels.values())):
+        report, cached = run_cell(rules, args.hands, args.seed, args.play, args.ai_play, args.ai_players,
+                                  args.job_hands, args.workers, args.cache_dir)
+        computed += not cached
+        o = report["overall"]
+        print("  ".join(f"{v:>11}" for v in values) +
+              f"  {o['ev']:+15.5f}  {o['se']:7.5f}  {o['sd']:8.4f}{'  (cached)' if cached else ''}")
+        results.append({"rules": rules.as_dict(), "cached": cached, **report})
+    print(f"{len(cells)} cells, {computed} simulated in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
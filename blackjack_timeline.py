@@ -0,0 +1,58 @@
+"""Callbacks scheduled on the main loop clock instead of blocking delays."""
+from collections import deque
+
+
+class Timeline:
+    """Runs scheduled callbacks from update(now), one frame at a time.
+
+    Events on the same channel run in order: each one fires its delay after
+    the previous event on that channel, so a channel works like a queue of
+    card reveals. speed divides every scaled delay (2.0 is twice as fast);
+    0 skips animations, firing their events on the next update.
+    """
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self.now = 0
+        self.channels = {}  # name -> deque of (delay, fn, scaled)
+        self.due = {}  # name -> time the head event fires
+        self._anon = 0
+
+    def after(self, delay, fn, channel=None, scaled=True):
+        if channel is None:
+            self._anon += 1
+            channel = ("anon", self._anon)
+        queue = self.channels.setdefault(channel, deque())
+        queue.append((delay, fn, scaled))
+        if len(queue) == 1:
+            self.due[channel] = self.now + self._delay(delay, scaled)
+
+    def cancel(self, channel):
+        self.channels.pop(channel, None)
+        self.due.pop(channel, None)
+
+    def busy(self, channel=None):
+        if channel is None:
+            return bool(self.channels)
+        return bool(self.channels.get(channel))
+
+    def next_due(self):
+        """Time the next event fires, or None when nothing is scheduled."""
+        return min(self.due.values(), default=None)
+
+    def update(self, now):
+        self.now = now
+        for channel in list(self.channels):
+            queue = self.channels.get(channel)
+            while queue and self.channels.get(channel) is queue and self.due[channel] <= now:
+                _, fn, _ = queue.popleft()
+                if queue:
+                    delay, _, scaled = queue[0]
+                    self.due[channel] = now + self._delay(delay, scaled)
+                fn()
+            if channel in self.channels and not self.channels[channel]:
+                self.cancel(channel)
+
+    def _delay(self, delay, scaled):
+        if not scaled:
+            return delay
+        return delay / self.speed if self.speed else 0
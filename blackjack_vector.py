@@ -0,0 +1,223 @@
+"""NumPy batch versions of the engine rules for offline analysis.
+
+Hands are rows of an integer array holding card points (ace = 11, 0 = empty
+slot). Each row is an independent shoe, so N rounds are played side by side:
+either explicit shuffled shoes in dealing order, or a ShoeBatch that draws
+straight from per-row rank counts.
+"""
+import numpy as np
+
+from blackjack_engine import CARD_VALUE, NUM_DECKS, NUM_AI_PLAYERS
+from blackjack_strategy import DOUBLE, MAX_TC, SOFT, STAND, TABLE_SIZE, UPCARDS
+
+DECK_POINTS = np.frombuffer(CARD_VALUE, dtype=np.int8)
+# Cards per deck with 2..11 points, index 0 is a two and index 9 an ace
+DECK_COUNTS = np.bincount(DECK_POINTS - 2, minlength=10).astype(np.int16)
+CHUNK = 1 << 16  # rows per batch in play_rounds
+
+
+def encode_hands(hands, width=None):
+    """Pack a list of engine hands into an (N, width) point array."""
+    width = width or max((len(h) for h in hands), default=0)
+    out = np.zeros((len(hands), width), dtype=np.int8)
+    for i, hand in enumerate(hands):
+        out[i, :len(hand)] = [CARD_VALUE[c] for c in hand]
+    return out
+
+
+def _totals(total, aces):
+    # Count each ace as 1 instead of 11 until the hand is 21 or under
+    reduce = np.clip((total - 12) // 10, 0, aces)
+    total = total - 10 * reduce
+    return total, aces > reduce
+
+
+def hand_totals(cards):
+    """Totals and soft flags for every row of an (N, M) point array."""
+    cards = np.asarray(cards)
+    total = cards.sum(axis=1, dtype=np.int16)
+    aces = (cards == 11).sum(axis=1, dtype=np.int16)
+    return _totals(total, aces)
+
+
+def shuffled_shoes(n, num_decks=NUM_DECKS, rng=None):
+    """n independently shuffled shoes as an (n, 52 * num_decks) point array."""
+    rng = rng if rng is not None else np.random.default_rng()
+    shoes = np.broadcast_to(np.tile(DECK_POINTS, num_decks), (n, 52 * num_decks))
+    return rng.permuted(shoes, axis=1)
+
+
+class ShoeBatch:
+    """n shoes kept as rank counts; each draw samples without replacement.
+
+    Sampling from the counts is statistically the same as dealing from a
+    shuffled shoe but never materialises the shuffled cards, which otherwise
+    dominates the run time. counts is (n, 10) per row, stored rank-major so
+    the cumulative sums run across whole rows at once.
+    """
+    def __init__(self, n, num_decks=NUM_DECKS, rng=None, counts=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        if counts is None:
+            counts = np.tile(DECK_COUNTS * num_decks, (n, 1))
+        self._counts = np.array(counts, dtype=np.int32).T.copy()
+        self._full = DECK_COUNTS.astype(np.int32) * num_decks
+        self.rows = np.arange(self._counts.shape[1])
+
+    @property
+    def counts(self):
+        return self._counts.T
+
+    def cards_left(self):
+        return self._counts.sum(axis=0)
+
+    def refill(self, mask):
+        """Start a fresh shoe in the rows in mask."""
+        self._counts[:, mask] = self._full[:, None]
+
+    def draw(self, mask=None):
+        """Next card points for rows in mask (all rows by default), else 0."""
+        rows = self.rows if mask is None else self.rows[mask]
+        cum = self._counts[:, rows].cumsum(axis=0)
+        empty = cum[-1] == 0
+        if empty.any():  # ran past the end of a deep cut mid-round, as Shoe.draw does
+            self._counts[:, rows[empty]] = self._full[:, None]
+            cum = self._counts[:, rows].cumsum(axis=0)
+        pick = (self.rng.random(len(rows)) * cum[-1]).astype(np.int32)
+        idx = (cum <= pick).sum(axis=0)
+        self._counts[idx, rows] -= 1
+        out = np.zeros(len(self.rows), dtype=np.int8)
+        out[rows] = idx + 2
+        return out
+
+
+class _Hands:
+    """Running total and ace count per row, so draws never re-sum a hand."""
+    def __init__(self, *cols):
+        self.raw = np.add.reduce(cols, dtype=np.int16)
+        self.aces = np.add.reduce([c == 11 for c in cols], dtype=np.int16)
+
+    def add(self, card, mask):
+        self.raw += np.where(mask, card, 0)
+        self.aces += mask & (card == 11)
+
+    def value(self):
+        return _totals(self.raw, self.aces)[0]
+
+
+def _draw_to(hand, draw, active, stand_on=17):
+    # Every row below stand_on takes its next card until none are left
+    active = active.copy()
+    while True:
+        active &= hand.value() < stand_on
+        if not active.any():
+            return hand.value()
+        hand.add(draw(active), active)
+
+
+def dealer_playout(shoes, hole, upcard, pos=None):
+    """Dealer draws to 17 in every row. Returns (totals, cards drawn).
+
+    hole/upcard are point arrays; pos is each row's next card index into
+    shoes (default 0). Dealer stands on all 17s like Table.play_dealer.
+    """
+    shoes = np.asarray(shoes)
+    rows = np.arange(len(shoes))
+    pos = np.zeros(len(shoes), dtype=np.intp) if pos is None else np.array(pos, dtype=np.intp)
+    start = pos.copy()
+
+    def draw(mask):
+        card = shoes[rows, pos]
+        pos[:] += mask
+        return card
+
+    hand = _Hands(np.asarray(hole), np.asarray(upcard))
+    totals = _draw_to(hand, draw, np.ones(len(shoes), dtype=bool))
+    return totals, pos - start
+
+
+def _play_tables(hand, upcard, strategy, true_count, draw, active):
+    # The player follows the strategy tables, doubling on the first two
+    # cards and never splitting. Returns (totals, doubled rows).
+    tables = np.frombuffer(strategy.tables, dtype=np.uint8)
+    n = len(upcard)
+    tc = np.zeros(n, dtype=np.intp)
+    if strategy.deviations and true_count is not None:
+        tc = np.clip(np.floor(true_count), -MAX_TC, MAX_TC).astype(np.intp)
+    base = (tc + MAX_TC) * 2 * TABLE_SIZE + upcard.astype(np.intp) - 2
+    first = TABLE_SIZE  # the first-two-cards table allows doubling
+    doubled = np.zeros(n, dtype=bool)
+    active = active.copy()
+    while True:
+        total, soft = _totals(hand.raw, hand.aces)
+        active &= total < 21
+        if not active.any():
+            return hand.value(), doubled
+        row = np.where(soft, SOFT + total, total).astype(np.intp)
+        action = tables[base + first + row * UPCARDS]
+        active &= action != STAND
+        hand.add(draw(active), active)
+        doubled |= active & (action == DOUBLE)
+        active &= action != DOUBLE
+        first = 0
+
+
+def play_chunk(shoe, num_ai_players=NUM_AI_PLAYERS, take_insurance=False, strategy=None, true_count=None):
+    """Net result in bets of one round in every row of a ShoeBatch.
+
+    With strategy (a blackjack_strategy.Strategy) the player plays its
+    tables, at each row's true_count when it has deviations; otherwise the
+    player hits below 17.
+    """
+    # Deal order matches Table.deal: player, dealer, AI seats, twice round
+    seats = 2 + num_ai_players
+    first = [shoe.draw() for _ in range(seats)]
+    second = [shoe.draw() for _ in range(seats)]
+    player = _Hands(first[0], second[0])
+    dealer = _Hands(first[1], second[1])
+    upcard_ace = second[1] == 11
+    n = len(upcard_ace)
+
+    player_bj = player.value() == 21
+    dealer_bj = dealer.value() == 21
+    net = np.zeros(n)
+
+    # Blackjack pays 3:2 unless the dealer shows an ace
+    paid_bj = player_bj & ~upcard_ace
+    net[paid_bj] = 1.5
+
+    # Insurance is half the bet and returns twice its stake; the main bet is
+    # lost to a dealer blackjack even when the player holds one too
+    if take_insurance:
+        net[upcard_ace] += np.where(dealer_bj[upcard_ace], 0.5, -0.5)
+    ended = paid_bj | (upcard_ace & dealer_bj)
+    net[upcard_ace & dealer_bj] -= 1
+
+    # The player plays, then the AI seats (hitting below 17) and the dealer
+    live = ~ended
+    if strategy is None:
+        player_total, doubled = _draw_to(player, shoe.draw, live), False
+    else:
+        player_total, doubled = _play_tables(player, second[1], strategy, true_count, shoe.draw, live)
+    for i in range(2, seats):
+        _draw_to(_Hands(first[i], second[i]), shoe.draw, live)
+    dealer_total = _draw_to(dealer, shoe.draw, live)
+
+    win = (player_total <= 21) & ((dealer_total > 21) | (player_total > dealer_total))
+    lose = (player_total > 21) | ((dealer_total <= 21) & (player_total < dealer_total))
+    net[live] += (np.where(win, 1.0, np.where(lose, -1.0, 0.0)) * (1 + doubled))[live]
+    return net
+
+
+def play_rounds(n, num_decks=NUM_DECKS, num_ai_players=NUM_AI_PLAYERS, rng=None, take_insurance=False):
+    """Net result in bets of n rounds, each dealt from a fresh shoe.
+
+    The player hits below 17 like Table.play_round's default strategy, and
+    payouts follow Table: 3:2 blackjack, 2:1 insurance, even money otherwise.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    out = np.empty(n)
+    for start in range(0, n, CHUNK):
+        stop = min(n, start + CHUNK)
+        shoe = ShoeBatch(stop - start, num_decks, rng)
+        out[start:stop] = play_chunk(shoe, num_ai_players, take_insurance)
+    return out
@@ -0,0 +1,97 @@
+"""Table payouts on stacked shoes, and the seeded simulation they add up to."""
+from array import array
+
+from blackjack_engine import Rules, Shoe, ShoePool, ShoeStream, Table, make_card
+from blackjack_sim import simulate
+
+
+class Stacked:
+    """A shoe source dealing the given ranks in order, every shoe."""
+    num_decks = 1
+
+    def __init__(self, *ranks):
+        self.cards = [make_card(r, "hearts") for r in ranks]
+
+    def next_shoe(self):
+        return array('B', reversed(self.cards))  # the shoe draws from the end
+
+
+def table(*ranks, bet=20, chips=100):
+    # Deal order is player, dealer (hole card), player, dealer (upcard), then the hits
+    t = Table(shoe=Shoe(source=Stacked(*ranks), penetration=1.0), chips=chips, num_ai_players=0)
+    assert t.add_bet(bet)
+    return t
+
+
+def play_out(t):
+    t.finish()
+    return t.settle()
+
+
+def test_blackjack_pays_3_to_2():
+    t = table("A", "9", "K", "7", bet=25)
+    assert t.deal() == "over"
+    assert t.round.payout == 62  # the bet back and 37, rounded down as int(bet * 2.5) did
+    assert t.chip_count == 137
+
+
+def test_insurance_pays_2_to_1():
+    t = table("10", "K", "9", "A")
+    assert t.deal() == "insurance"
+    assert t.insurance(True) == "over"
+    assert t.round.insurance_bet == 10
+    assert t.round.payout == 20  # the stake back and 10 more, which covers half the lost bet
+    assert t.chip_count == 90
+
+
+def test_insurance_lost():
+    t = table("10", "5", "9", "A")
+    assert t.deal() == "insurance"
+    assert t.insurance(True) == "playing"
+    assert t.chip_count == 70
+
+
+def test_win_push_and_loss():
+    for ranks, payout, chips in ((("10", "10", "9", "8"), 40, 120),
+                                 (("10", "10", "8", "8"), 20, 100),
+                                 (("10", "10", "7", "8"), 0, 80)):
+        t = table(*ranks)
+        assert t.deal() == "playing"
+        assert play_out(t) == payout
+        assert t.chip_count == chips
+
+
+def test_double():
+    t = table("6", "10", "5", "7", "10")
+    t.deal()
+    assert t.double() is not None
+    assert t.chip_count == 60
+    assert play_out(t) == 80
+    assert t.chip_count == 140
+
+
+def test_bust():
+    t = table("10", "10", "6", "7", "K")
+    t.deal()
+    t.hit()
+    assert play_out(t) == 0
+    assert t.round.result == "Bust! You lose."
+    assert t.chip_count == 80
+
+
+def test_fork_leaves_the_parent_alone():
+    for pooled in (False, True):
+        source = ShoeStream(1, seed=5)
+        t = Table(shoe=Shoe(source=ShoePool(source) if pooled else source), chips=10 ** 9, rules=Rules(decks=1))
+        for _ in range(5):
+            t.play_round(10)
+        fork = t.fork()
+        forked = [fork.play_round(10) for _ in range(50)]  # reshuffles several times
+        assert [t.play_round(10) for _ in range(50)] == forked
+
+
+def test_simulate_is_seeded():
+    stats = simulate(2000, seed=3, workers=1)
+    assert (stats.n, stats.total, stats.sq) == (2000, -1475, 188175)
+    parallel = simulate(2000, seed=3, workers=2)
+    assert (parallel.n, parallel.total, parallel.sq) == (stats.n, stats.total, stats.sq)